@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -5,11 +6,78 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '.env'))
 
 
+def pool_options(pool_size=5, max_overflow=10, pool_recycle=1800, pool_timeout=30):
+    """Connection pool settings, each one can be overridden from the environment"""
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', max_overflow)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', pool_recycle)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', pool_timeout)),
+        'pool_pre_ping': (os.environ.get('DB_POOL_PRE_PING') or 'True') == 'True',
+    }
+
+
 class Config:
     APP_NAME = 'Tunga-HR'
     SECRET_KEY = os.environ.get('SECRET_KEY')
     
     SQLALCHEMY_COMMIT_ON_TEARDOWN = True
+
+    SQLALCHEMY_ENGINE_OPTIONS = pool_options()
+
+    # Maximum number of tenant engines/sessions cached per worker
+    TENANT_REGISTRY_SIZE = int(os.environ.get('TENANT_REGISTRY_SIZE', 1024))
+
+    TENANT_MIGRATIONS_DIR = os.path.join(basedir, 'migrations', 'tenant')
+
+    # Spare tenant schemas, refilled in the background below the low-water mark
+    TENANT_POOL_LOW_WATER = int(os.environ.get('TENANT_POOL_LOW_WATER', 0))
+    TENANT_POOL_SIZE = int(os.environ.get('TENANT_POOL_SIZE', 10))
+
+    # Seconds after which a provisioning job that stopped making progress
+    # can be taken over by `flask tenants retry-provisioning`
+    PROVISIONING_LEASE_SECONDS = int(os.environ.get('PROVISIONING_LEASE_SECONDS', 900))
+
+    # Number of processes used to migrate tenant schemas
+    TENANT_MIGRATION_WORKERS = int(os.environ.get('TENANT_MIGRATION_WORKERS', 1))
+
+    # How tenant schemas are bound to requests: search_path or translate
+    TENANT_BINDING_MODE = os.environ.get('TENANT_BINDING_MODE', 'search_path')
+    TENANT_RESET_ON_CHECKIN = (os.environ.get('TENANT_RESET_ON_CHECKIN') or 'False') == 'True'
+
+    # Read replicas used by read-only endpoints, comma separated
+    SQLALCHEMY_REPLICA_URIS = [
+        url.replace('postgres://', 'postgresql://')
+        for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url
+    ]
+    # Seconds a failed replica is skipped for
+    REPLICA_RETRY_AFTER = int(os.environ.get('REPLICA_RETRY_AFTER', 30))
+
+    # Emails of the operators allowed to read the deployment wide statistics
+    # of /account/pool-stats, comma separated. Nobody can when unset.
+    OPERATOR_EMAILS = [
+        email.strip().lower()
+        for email in os.environ.get('OPERATOR_EMAILS', '').split(',') if email.strip()
+    ]
+
+    # Password hashing, PASSWORD_HASH_METHOD is a full werkzeug method string
+    # and hashes made with other parameters are upgraded on login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+    # Shared cache backend, keeps in-process caches consistent across workers
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    MEMBERSHIP_CACHE_TTL = int(os.environ.get('MEMBERSHIP_CACHE_TTL', 60))
+    MEMBERSHIP_CACHE_SIZE = int(os.environ.get('MEMBERSHIP_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    ORGANIZATION_CACHE_TTL = int(os.environ.get('ORGANIZATION_CACHE_TTL', 300))
+    USER_ORGANIZATION_CACHE_TTL = int(os.environ.get('USER_ORGANIZATION_CACHE_TTL', 300))
+    # without CACHE_REDIS_URL other workers see leave changes only after the TTL
+    LEAVE_CALENDAR_CACHE_TTL = int(os.environ.get('LEAVE_CALENDAR_CACHE_TTL', 60))
+    LEAVE_CALENDAR_CACHE_SIZE = int(os.environ.get('LEAVE_CALENDAR_CACHE_SIZE', 1000))
     
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT') 
 
@@ -25,6 +93,23 @@ class Config:
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
     ADMINS = ['support@cherio.tech']
 
+    # Mail workers delivering the outbox, each keeps its SMTP connection
+    # open during bursts
+    MAIL_WORKERS = int(os.environ.get('MAIL_WORKERS', 2))
+    MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE', 1000))
+    MAIL_QUEUE_TIMEOUT = int(os.environ.get('MAIL_QUEUE_TIMEOUT', 5))
+    MAIL_MAX_PER_CONNECTION = int(os.environ.get('MAIL_MAX_PER_CONNECTION', 100))
+    MAIL_IDLE_TIMEOUT = float(os.environ.get('MAIL_IDLE_TIMEOUT', 1))
+
+    # Email outbox drained by `flask outbox drain`, retries back off
+    # exponentially from OUTBOX_RETRY_BASE seconds
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 50))
+    OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 300))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+    OUTBOX_RETRY_BASE = int(os.environ.get('OUTBOX_RETRY_BASE', 30))
+    OUTBOX_RETRY_MAX = int(os.environ.get('OUTBOX_RETRY_MAX', 3600))
+    OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 2))
+
     S3_BUCKET = os.environ.get('S3_BUCKET')
     S3_KEY = os.environ.get('S3_KEY')
     S3_SECRET = os.environ.get('S3_SECRET')
@@ -32,9 +117,45 @@ class Config:
 
     ALLOWED_EXTENSIONS = set(['txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif'])
 
+    USERS_PER_PAGE = int(os.environ.get('USERS_PER_PAGE', 50))
+    MAX_PER_PAGE = int(os.environ.get('MAX_PER_PAGE', 500))
+
+    # Rows fetched per server side cursor batch and bytes per response chunk
+    # of the streaming exports
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 64 * 1024))
+
+    # Group concurrent clock-ins/outs into multi-row writes, waiting up to
+    # ATTENDANCE_BATCH_WAIT seconds for ATTENDANCE_BATCH_SIZE events
+    ATTENDANCE_BATCH_WRITES = (os.environ.get('ATTENDANCE_BATCH_WRITES') or 'False') == 'True'
+    ATTENDANCE_BATCH_SIZE = int(os.environ.get('ATTENDANCE_BATCH_SIZE', 500))
+    ATTENDANCE_BATCH_WAIT = float(os.environ.get('ATTENDANCE_BATCH_WAIT', 0.01))
+    ATTENDANCE_WRITE_TIMEOUT = float(os.environ.get('ATTENDANCE_WRITE_TIMEOUT', 5))
+    TIMESHEET_MAX_DAYS = int(os.environ.get('TIMESHEET_MAX_DAYS', 366))
+
+    # Punch log imports are validated and staged IMPORT_CHUNK_SIZE rows at a
+    # time, punches of an employee within IMPORT_DEDUPE_SECONDS of the
+    # previous one are repeats
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 5000))
+    IMPORT_DEDUPE_SECONDS = int(os.environ.get('IMPORT_DEDUPE_SECONDS', 60))
+    IMPORT_MAX_REJECTED_ROWS = int(os.environ.get('IMPORT_MAX_REJECTED_ROWS', 100))
+
+    # Leave days per type and year as JSON, null for leave without a limit
+    LEAVE_ENTITLEMENTS = json.loads(os.environ.get('LEAVE_ENTITLEMENTS') or 
+                                    '{"Annual": 21, "Sick": 14, "Maternity": 60, '
+                                    '"Paternity": 4, "Compassionate": 3, "Unpaid": null}')
+
+    MAX_BULK_INVITES = int(os.environ.get('MAX_BULK_INVITES', 5000))
+
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')
 
+    # In-process task workers, used when no celery broker is configured
+    TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 4))
+    TASKS_ALWAYS_EAGER = False
+
+    SEND_ACCOUNT_VALIDATION_EMAIL = (os.environ.get('SEND_ACCOUNT_VALIDATION_EMAIL') or 'False') == 'True'
+
     @staticmethod
     def init_app(app):
         pass
@@ -53,6 +174,8 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'data-test.db')
     WTF_CSRF_ENABLED = False
+    TASKS_ALWAYS_EAGER = True
+    PASSWORD_HASH_WORKERS = 0
     SQLALCHEMY_BINDS = {"public": SQLALCHEMY_DATABASE_URI}
 
 
@@ -61,6 +184,15 @@ class ProductionConfig(Config):
         'postgres://', 'postgresql://')
     SSL_DISABLE = (os.environ.get('SSL_DISABLE') or 'True') == 'True'
     SQLALCHEMY_BINDS = {"public": SQLALCHEMY_DATABASE_URI}
+    SQLALCHEMY_ENGINE_OPTIONS = pool_options(pool_size=10, max_overflow=20)
+
+    # Behind PgBouncer in transaction pooling mode session state such as the
+    # search_path cannot be kept on a connection, so tenants are bound with
+    # schema_translate_map only
+    PGBOUNCER = (os.environ.get('PGBOUNCER') or 'False') == 'True'
+    if PGBOUNCER:
+        TENANT_BINDING_MODE = 'translate'
+        TENANT_RESET_ON_CHECKIN = False
 
     @classmethod
     def init_app(cls, app):
@@ -1,9 +1,13 @@
 import os
 
-from tunga_hr_app import create_app, db
+from tunga_hr_app import create_app, db, cli
 from tunga_hr_app.models.public import User
 
 app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+cli.register(app)
+
+# celery -A manage.celery_app worker
+celery_app = app.extensions.get('celery')
 
 @app.shell_context_processor
 def make_shell_context():
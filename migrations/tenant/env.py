@@ -1,4 +1,7 @@
 import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 from logging.config import fileConfig
 
 from flask import current_app
@@ -8,6 +11,8 @@ from sqlalchemy import engine_from_config, text
 from sqlalchemy.pool import NullPool
 
 from tunga_hr_app.models.public import Organization
+from tunga_hr_app.utils.database import quote_schema
+from tunga_hr_app.utils.migrations import init_migration_worker, migrate_tenant_worker
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -52,7 +57,8 @@ target_db = current_app.extensions["migrate"].db
 # ... etc.
 
 # list of tenants
-tenants = [tenant.organization_id for tenant in Organization.query.all()]
+tenants = [str(organization_id) for organization_id, in
+           target_db.session.query(Organization.organization_id)]
 
 # For initial migrations, uncomment this next line
 #tenants = ["test"]
@@ -85,44 +91,130 @@ def run_migrations_offline():
         context.run_migrations()
 
 
-def run_migrations_online():
-    """Updated migration script for handling schema based multi-tenancy
+def get_tenant_versions(connection):
+    """Return the current revision of every tenant schema in one query"""
+    schemas = set(connection.execute(text(
+        "SELECT table_schema FROM information_schema.tables "
+        "WHERE table_name = 'alembic_version'"
+    )).scalars()) & set(tenants)
 
-    ref:
-     - https://alembic.sqlalchemy.org/en/latest/cookbook.html#rudimental-schema-level-multi-tenancy-for-postgresql-databases # noqa
+    if not schemas:
+        return {}
+
+    query = " UNION ALL ".join(
+        f"SELECT '{schema}' AS tenant, version_num "
+        f"FROM {quote_schema(schema)}.alembic_version"
+        for schema in schemas
+    )
+    return dict(connection.execute(text(query)).all())
+
+
+def get_pending_tenants(connection):
+    """Tenants that are not at the head revision yet
+
+    Every tenant records its own progress in its alembic_version table, so
+    re-running an upgrade after a failure resumes with the tenants that
+    were not migrated.
     """
+    heads = set(context.script.get_heads())
+    versions = get_tenant_versions(connection)
+    return [tenant for tenant in tenants if versions.get(tenant) not in heads]
+
+
+def migrate_tenant(connection, tenant):
+    # set search path on the connection, which ensures that
+    # PostgreSQL will emit all CREATE / ALTER / DROP statements
+    # in terms of this schema by default
+    connection.execute(text(f"SET search_path TO {quote_schema(tenant)}"))
+    # in SQLAlchemy v2+ the search path change needs to be committed
+    connection.commit()
+
+    # make use of non-supported SQLAlchemy attribute to ensure
+    # the dialect reflects tables in terms of the current tenant name
+    connection.dialect.default_schema_name = tenant
 
-    connectable = engine_from_config(
+    context.configure(
+        connection=connection,
+        target_metadata=get_metadata(),
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def get_connectable():
+    return engine_from_config(
         config.get_section(config.config_ini_section),
         prefix="sqlalchemy.",
         poolclass=NullPool,
     )
 
+
+def migrate_tenant_isolated(tenant):
+    """Migrate a single tenant on its own connection"""
+    with get_connectable().connect() as connection:
+        migrate_tenant(connection, tenant)
+
+
+def run_migrations_online():
+    """Updated migration script for handling schema based multi-tenancy
+
+    Tenants are migrated by TENANT_MIGRATION_WORKERS processes (or
+    `-x workers=N`), each on its own connection. When upgrading to head
+    only the tenants behind head are migrated, pass `-x only_behind=false`
+    to run every tenant.
+
+    ref:
+     - https://alembic.sqlalchemy.org/en/latest/cookbook.html#rudimental-schema-level-multi-tenancy-for-postgresql-databases # noqa
+    """
+    x_args = context.get_x_argument(as_dictionary=True)
+    workers = int(x_args.get(
+        "workers", current_app.config.get("TENANT_MIGRATION_WORKERS", 1)))
+    only_behind = x_args.get("only_behind", "true").lower() == "true"
+    autogenerate = getattr(config.cmd_opts, "autogenerate", False)
+
+    connectable = get_connectable()
+
     with connectable.connect() as connection:
-        for tenant in tenants:
-            logger.info(f"Migrating tenant: {tenant}")
-            # set search path on the connection, which ensures that
-            # PostgreSQL will emit all CREATE / ALTER / DROP statements
-            # in terms of this schema by default
-            connection.execute(text(f'SET search_path TO "{tenant}"'))
-            # in SQLAlchemy v2+ the search path change needs to be committed
-            # connection.commit()
-
-            # make use of non-supported SQLAlchemy attribute to ensure
-            # the dialect reflects tables in terms of the current tenant name
-            connection.dialect.default_schema_name = tenant
-
-            context.configure(
-                connection=connection,
-                target_metadata=get_metadata(),
-            )
-
-            with context.begin_transaction():
-                context.run_migrations()
-
-            # for checking migrate or upgrade is running
-            if getattr(config.cmd_opts, "autogenerate", False):
-                break
+        pending = tenants
+        if only_behind and not autogenerate and \
+                context.get_revision_argument() in ("head", "heads"):
+            pending = get_pending_tenants(connection)
+            connection.commit()
+        logger.info(f"Migrating {len(pending)} of {len(tenants)} tenants")
+
+        if workers <= 1 or autogenerate or len(pending) <= 1:
+            for tenant in pending:
+                logger.info(f"Migrating tenant: {tenant}")
+                started = time.perf_counter()
+                migrate_tenant(connection, tenant)
+                logger.info(f"Migrated tenant {tenant} in "
+                            f"{time.perf_counter() - started:.2f}s")
+
+                # for checking migrate or upgrade is running
+                if autogenerate:
+                    break
+            return
+
+    started = time.perf_counter()
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("fork"),
+                             initializer=init_migration_worker,
+                             initargs=(get_engine(), migrate_tenant_isolated)) as executor:
+        for tenant, duration, error in executor.map(migrate_tenant_worker, pending):
+            if error:
+                failed.append(tenant)
+                logger.error(f"Failed migrating tenant {tenant} after "
+                             f"{duration:.2f}s: {error}")
+            else:
+                logger.info(f"Migrated tenant {tenant} in {duration:.2f}s")
+
+    logger.info(f"Migrated {len(pending) - len(failed)} tenants with "
+                f"{workers} workers in {time.perf_counter() - started:.2f}s")
+    if failed:
+        raise Exception(f"Migrating tenants {', '.join(failed)} failed, "
+                        "run the upgrade again to resume.")
 
 
 if context.is_offline_mode():
@@ -0,0 +1,134 @@
+"""Test fixtures
+
+the app runs on SQLite files, one per schema: the public schema and the
+tenant schemas are attached to every connection under their own names and
+tenants are bound with schema_translate_map, as on PgBouncer
+"""
+import os
+import sqlite3
+
+os.environ.setdefault('MAIL_PORT', '25')
+os.environ.setdefault('SECRET_KEY', 'a-secret-key-only-used-by-the-tests')
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+from config import TestingConfig
+from tunga_hr_app import create_app, db
+from tunga_hr_app.models import Organization, User, UserOrganization
+
+# organizations get the ids 1 and 2, which are also their schema names
+TENANTS = ('1', '2')
+SCHEMAS = ('public',) + TENANTS
+
+
+def _attach_schemas(dbapi_connection, connection_record):
+    """attach the schema files kept next to the main database file"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    path = dbapi_connection.execute('PRAGMA database_list').fetchone()[2]
+    if not path:
+        return
+    for schema in SCHEMAS:
+        dbapi_connection.execute(
+            f'ATTACH DATABASE ? AS "{schema}"',
+            (os.path.join(os.path.dirname(path), f'{schema}.db'),)
+        )
+
+
+@pytest.fixture(autouse=True)
+def attached_schemas():
+    event.listen(Engine, 'connect', _attach_schemas)
+    yield
+    event.remove(Engine, 'connect', _attach_schemas)
+
+
+def database_uri(directory):
+    return 'sqlite:///' + os.path.join(directory, 'main.db')
+
+
+def create_database(directory):
+    """create the public and tenant tables of a database in `directory`
+
+    returns:
+        str: the database URI
+    """
+    uri = database_uri(directory)
+    engine = create_engine(uri)
+    db.metadatas['public'].create_all(engine)
+    for tenant in TENANTS:
+        db.metadatas[None].create_all(
+            engine.execution_options(schema_translate_map={None: tenant}))
+    engine.dispose()
+    return uri
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    uri = create_database(str(tmp_path))
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', uri)
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_BINDS', {'public': uri})
+    monkeypatch.setattr(TestingConfig, 'TENANT_BINDING_MODE', 'translate')
+
+    app = create_app('testing')
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+        replicas = app.extensions.get('replicas')
+        for engine in replicas.engines if replicas else []:
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class Members:
+    """an organization with an admin (the first user) and employees"""
+
+    def __init__(self, app, organization_id, user_ids):
+        self.app = app
+        self.organization_id = organization_id
+        self.user_ids = user_ids
+        self.admin_id = user_ids[0]
+        self.employee_ids = user_ids[1:]
+
+    def headers(self, user_id=None):
+        """authorization headers of a member, the admin by default"""
+        with self.app.app_context():
+            token = create_access_token(
+                identity=str(user_id or self.admin_id),
+                additional_claims={'tenant': str(self.organization_id)}
+            )
+        return {'Authorization': f'Bearer {token}'}
+
+
+def add_organization(app, name='Acme', employees=4):
+    with app.app_context():
+        organization = Organization({'organization_name': name, 'country': 'Uganda'})
+        db.session.add(organization)
+        db.session.flush()
+
+        user_ids = []
+        for n in range(employees + 1):
+            user = User({'first_name': f'First{n}', 'last_name': f'Last{n}',
+                         'email': f'user{n}@{name.lower()}.test',
+                         'role': 'Employee' if n else 'Admin'})
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(UserOrganization(user_id=user.user_id,
+                                            organization_id=organization.organization_id))
+            user_ids.append(user.user_id)
+        db.session.commit()
+        return Members(app, organization.organization_id, user_ids)
+
+
+@pytest.fixture
+def organization(app):
+    return add_organization(app)
@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_second_clock_in_conflicts(client, organization):
+    headers = organization.headers(organization.employee_ids[0])
+
+    response = client.post('/attendance/clock-in', headers=headers)
+    assert response.status_code == 201
+
+    response = client.post('/attendance/clock-in', headers=headers)
+    assert response.status_code == 409
+
+    assert client.post('/attendance/clock-out', headers=headers).status_code == 200
+    assert client.post('/attendance/clock-out', headers=headers).status_code == 409
+    assert client.post('/attendance/clock-in', headers=headers).status_code == 201
+
+
+def clock_in_together(app, headers, times):
+    def clock_in(_):
+        return app.test_client().post('/attendance/clock-in', headers=headers).status_code
+
+    with ThreadPoolExecutor(max_workers=times) as executor:
+        return sorted(executor.map(clock_in, range(times)))
+
+
+def test_concurrent_clock_ins_open_one_shift(app, organization):
+    headers = organization.headers(organization.employee_ids[0])
+
+    assert clock_in_together(app, headers, 8) == [201] + [409] * 7
+
+
+def test_batched_clock_ins_open_one_shift(app, organization):
+    app.config['ATTENDANCE_BATCH_WRITES'] = True
+    app.config['ATTENDANCE_BATCH_WAIT'] = 0.05
+    headers = organization.headers(organization.employee_ids[0])
+
+    assert clock_in_together(app, headers, 8) == [201] + [409] * 7
+
+    other = organization.headers(organization.employee_ids[1])
+    assert app.test_client().post('/attendance/clock-in', headers=other).status_code == 201
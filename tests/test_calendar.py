@@ -0,0 +1,38 @@
+def approved_leave(client, organization, employee_id, start, end):
+    response = client.post('/leave/requests', headers=organization.headers(employee_id), json={
+        'leave_type': 'Annual', 'start_date': start, 'end_date': end
+    })
+    leave_id = response.get_json()['leave_id']
+    client.post(f'/leave/requests/{leave_id}/approve', headers=organization.headers())
+
+
+def test_calendar_counts_employees_away(client, organization):
+    employee_id = organization.employee_ids[0]
+    headers = organization.headers(employee_id)
+    approved_leave(client, organization, employee_id, '2030-03-04', '2030-03-05')
+
+    response = client.get('/leave/calendar?start=2030-03-03&end=2030-03-06', headers=headers)
+    days = {day['date']: day for day in response.get_json()['days']}
+    assert days['2030-03-03']['out'] == []
+    assert days['2030-03-04']['out'] == [employee_id]
+    assert days['2030-03-05']['available_count'] == len(organization.user_ids) - 1
+    assert days['2030-03-06']['out'] == []
+
+
+def test_calendar_without_organization(client, organization, monkeypatch):
+    monkeypatch.setattr('tunga_hr_app.leave.routes.get_user_organization', lambda user_id: None)
+
+    response = client.get('/leave/calendar', headers=organization.headers())
+    assert response.status_code == 404
+
+
+def test_cached_month_is_dropped_when_leave_changes(client, organization):
+    employee_id = organization.employee_ids[0]
+    headers = organization.headers(employee_id)
+    url = '/leave/calendar?start=2030-03-01&end=2030-03-31'
+
+    assert all(day['out'] == [] for day in client.get(url, headers=headers).get_json()['days'])
+
+    approved_leave(client, organization, employee_id, '2030-03-04', '2030-03-05')
+    days = {day['date']: day for day in client.get(url, headers=headers).get_json()['days']}
+    assert days['2030-03-04']['out'] == [employee_id]
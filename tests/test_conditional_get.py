@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+from werkzeug.http import http_date
+
+from tunga_hr_app import db
+from tunga_hr_app.models import User, UserOrganization
+from tunga_hr_app.models.public import invalidate_user
+
+
+def get(client, organization, url, **headers):
+    return client.get(url, headers={**organization.headers(), **headers})
+
+
+def touch_user(app, user_id):
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        user.job_title = 'Manager'
+        user.updated_at = datetime.now(timezone.utc) + timedelta(seconds=5)
+        db.session.commit()
+        invalidate_user(user_id)
+
+
+def test_view_users_is_revalidated(app, client, organization):
+    url = '/account/view-users?limit=2'
+    response = get(client, organization, url)
+    assert response.status_code == 200
+    assert response.cache_control.private and response.cache_control.no_cache
+    assert 'Authorization' in response.headers['Vary']
+    etag = response.headers['ETag']
+
+    response = get(client, organization, url, **{'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+
+    # every page and projection has its own tag
+    assert get(client, organization, url + '&fields=user_id').headers['ETag'] != etag
+
+    touch_user(app, organization.employee_ids[-1])
+    response = get(client, organization, url, **{'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_view_users_changes_with_the_headcount(app, client, organization):
+    url = '/account/view-users'
+    etag = get(client, organization, url).headers['ETag']
+
+    # a member who joins without moving the newest updated_at
+    with app.app_context():
+        user = User({'first_name': 'Old', 'last_name': 'Hand', 'email': 'old@acme.test'})
+        user.updated_at = datetime(2000, 1, 1)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(UserOrganization(user_id=user.user_id,
+                                        organization_id=organization.organization_id))
+        db.session.commit()
+
+    assert get(client, organization, url, **{'If-None-Match': etag}).status_code == 200
+
+
+def test_view_user_answers_if_modified_since(app, client, organization):
+    response = get(client, organization, '/account/view-user')
+    assert response.status_code == 200
+    last_modified = response.headers['Last-Modified']
+
+    response = get(client, organization, '/account/view-user', **{'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+
+    touch_user(app, organization.admin_id)
+    response = get(client, organization, '/account/view-user', **{'If-Modified-Since': last_modified})
+    assert response.status_code == 200
+    assert response.json['job_title'] == 'Manager'
+
+
+def test_organization_info_is_revalidated(client, organization):
+    response = get(client, organization, '/account/organization-info')
+    etag = response.headers['ETag']
+    assert get(client, organization, '/account/organization-info',
+               **{'If-None-Match': etag}).status_code == 304
+    assert get(client, organization, '/account/organization-info',
+               **{'If-Modified-Since': http_date(datetime(2000, 1, 1))}).status_code == 200
+
+    client.post('/account/update-organization', headers=organization.headers(),
+                json={'country': 'Kenya'})
+    response = get(client, organization, '/account/organization-info', **{'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['country'] == 'Kenya'
@@ -0,0 +1,114 @@
+import socketserver
+import threading
+
+import pytest
+
+from tunga_hr_app import db
+from tunga_hr_app.email import drain_outbox, mail_metrics, queue_email
+from tunga_hr_app.models import EmailOutbox
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """just enough SMTP for smtplib, recipients in `server.refused` are rejected"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost test server')
+        recipients = []
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 localhost')
+            elif verb in ('MAIL', 'RSET'):
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip().strip('<>')
+                if address in self.server.refused:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data in self.rfile:
+                    if data in (b'.\r\n', b'.\n'):
+                        break
+                self.server.delivered.extend(recipients)
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.delivered = []
+        self.refused = set()
+
+
+@pytest.fixture
+def smtp_server(app):
+    server = SMTPServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    state = app.extensions['mail']
+    state.server, state.port = server.server_address
+    state.use_tls = state.use_ssl = state.suppress = False
+    yield server
+
+    server.shutdown()
+    server.server_close()
+    dispatcher = app.extensions.get('mail_dispatcher')
+    if dispatcher is not None:
+        dispatcher.shutdown()
+
+
+def queue(app, *recipients):
+    with app.app_context():
+        for recipient in recipients:
+            queue_email('Welcome', 'hr@acme.test', [recipient], '<p>Welcome</p>')
+        db.session.commit()
+
+
+def outbox(app):
+    with app.app_context():
+        return {email.recipients: (email.status, email.attempts)
+                for email in db.session.scalars(db.select(EmailOutbox))}
+
+
+def test_outbox_is_delivered_over_smtp(app, smtp_server):
+    recipients = [f'user{n}@acme.test' for n in range(10)]
+    queue(app, *recipients)
+
+    with app.app_context():
+        assert drain_outbox() == 10
+        assert mail_metrics()['sent'] == 10
+
+    assert sorted(smtp_server.delivered) == sorted(recipients)
+    # each mail worker reuses its connection for the whole batch
+    assert smtp_server.connections <= app.config['MAIL_WORKERS']
+    assert set(outbox(app).values()) == {('Sent', 0)}
+
+
+def test_refused_email_is_retried_later(app, smtp_server):
+    smtp_server.refused.add('gone@acme.test')
+    queue(app, 'gone@acme.test', 'here@acme.test')
+
+    with app.app_context():
+        assert drain_outbox() == 1
+        # the refused email waits for its next attempt
+        assert drain_outbox() == 0
+
+    assert smtp_server.delivered == ['here@acme.test']
+    assert outbox(app) == {'gone@acme.test': ('Pending', 1), 'here@acme.test': ('Sent', 0)}
@@ -0,0 +1,61 @@
+import csv
+import gzip
+import io
+import json
+
+from tunga_hr_app.utils.export import iter_chunks, iter_gzip
+
+
+def export(client, organization, query='', **headers):
+    return client.get(f'/account/export/users{query}',
+                      headers={**organization.headers(), **headers})
+
+
+def test_users_are_exported_as_ndjson(client, organization):
+    response = export(client, organization)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=users.ndjson'
+    assert 'Content-Encoding' not in response.headers
+    users = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [user['user_id'] for user in users] == organization.user_ids
+    assert users[0]['email'] == 'user0@acme.test'
+    assert users[0]['role'] == 'Admin'
+
+
+def test_users_are_exported_as_csv(client, organization):
+    response = export(client, organization, '?format=csv&role=Employee')
+
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [int(row['user_id']) for row in rows] == organization.employee_ids
+    assert {row['role'] for row in rows} == {'Employee'}
+
+
+def test_export_is_streamed_and_gzipped(app, client, organization):
+    app.config.update(EXPORT_BATCH_SIZE=2, EXPORT_CHUNK_SIZE=1)
+    plain = export(client, organization).get_data()
+
+    response = export(client, organization, **{'Accept-Encoding': 'gzip'})
+    assert response.is_streamed
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.get_data()) == plain
+
+
+def test_chunks_are_compressed_as_they_arrive():
+    lines = [f'{n}\n' for n in range(1000)]
+    chunks = list(iter_chunks(lines, 100))
+
+    assert all(len(chunk) >= 100 for chunk in chunks[:-1])
+    assert b''.join(chunks) == ''.join(lines).encode()
+    assert gzip.decompress(b''.join(iter_gzip(chunks))) == b''.join(chunks)
+
+
+def test_invalid_exports(client, organization):
+    assert export(client, organization, '?format=xml').status_code == 400
+    assert export(client, organization, '?active=maybe').status_code == 400
+    response = client.get('/account/export/invites?format=csv', headers=organization.headers())
+    assert response.get_data(as_text=True).splitlines() == [
+        'invite_id,email,job_title,role,invited_by,created_at,updated_at']
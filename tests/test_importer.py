@@ -0,0 +1,132 @@
+import io
+from datetime import date, datetime
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.engine import Engine
+
+from tunga_hr_app.attendance import rollups
+from tunga_hr_app.models.tenant import Attendance, DailyAttendanceSummary
+from tunga_hr_app.utils.database import get_tenant_registry
+
+from .conftest import add_organization
+
+
+def upload(client, organization, log):
+    return client.post('/attendance/import', headers=organization.headers(),
+                       data={'file': (io.BytesIO(log.encode()), 'punches.csv')},
+                       content_type='multipart/form-data')
+
+
+def tenant_rows(app, organization, statement):
+    with app.app_context():
+        engine = get_tenant_registry().get(str(organization.organization_id))[0]
+        with engine.begin() as connection:
+            result = connection.execute(statement)
+            return result.all() if result.returns_rows else None
+
+
+def test_punches_are_paired_into_shifts(app, client, organization):
+    first, second = organization.employee_ids[:2]
+    log = (
+        'Employee_ID,Timestamp,Direction\n'
+        f'{first},2030-03-04T08:00:00,\n'
+        f'{first},2030-03-04T08:00:30,\n'          # repeated tap
+        f'{first},2030-03-04T20:00:00+03:00,\n'    # 17:00 UTC
+        f'{second},2030-03-04T22:00:00,in\n'
+        f'{second},2030-03-05T02:00:00,out\n'
+        'x,2030-03-04T09:00:00,\n'
+        f'{second},yesterday,\n'
+        f'{second},2030-03-04T09:00:00,sideways\n'
+    )
+
+    report = upload(client, organization, log).get_json()
+    assert report['rows'] == 8
+    assert report['staged'] == 5
+    assert report['duplicates'] == 1
+    assert report['shifts_created'] == 2
+    assert [row['line'] for row in report['rejected_rows']] == [7, 8, 9]
+
+    shifts = tenant_rows(app, organization, select(
+        Attendance.employee_id, Attendance.clock_in, Attendance.clock_out
+    ).order_by(Attendance.employee_id))
+    assert shifts == [
+        (first, datetime(2030, 3, 4, 8), datetime(2030, 3, 4, 17)),
+        (second, datetime(2030, 3, 4, 22), datetime(2030, 3, 5, 2)),
+    ]
+
+    # importing the same log again adds nothing
+    assert upload(client, organization, log).get_json()['shifts_created'] == 0
+
+
+def test_open_shift_is_closed_by_an_imported_out(app, client, organization):
+    employee_id = organization.employee_ids[0]
+    client.post('/attendance/clock-in', headers=organization.headers(employee_id))
+
+    report = upload(client, organization,
+                    f'employee_id,timestamp,direction\n{employee_id},2099-01-01T09:00:00,out\n')
+    assert report.get_json()['shifts_closed'] == 1
+
+    shift = tenant_rows(app, organization, select(Attendance.clock_out))
+    assert shift == [(datetime(2099, 1, 1, 9),)]
+
+
+def test_rollups_are_rebuilt_for_imported_employees_only(app, client, organization):
+    imported, other = organization.employee_ids[:2]
+    tenant_rows(app, organization, insert(DailyAttendanceSummary).values(
+        employee_id=other, work_date=date(2030, 3, 4), worked_seconds=3600, shifts=1
+    ))
+
+    upload(client, organization, 'employee_id,timestamp\n'
+                                 f'{imported},2030-03-04T08:00:00\n'
+                                 f'{imported},2030-03-04T12:00:00\n')
+
+    summaries = tenant_rows(app, organization, select(
+        DailyAttendanceSummary.employee_id, DailyAttendanceSummary.worked_seconds
+    ).order_by(DailyAttendanceSummary.employee_id))
+    assert summaries == [(imported, 4 * 3600), (other, 3600)]
+
+
+def test_log_without_the_required_columns_is_rejected(client, organization):
+    response = upload(client, organization, 'id,time\n1,2030-03-04T08:00:00\n')
+    assert response.status_code == 400
+
+
+def test_rollups_are_rebuilt_in_batches_of_employees(app, client, monkeypatch):
+    organization = add_organization(app, employees=7)
+    monkeypatch.setattr(rollups, 'EMPLOYEE_BATCH_SIZE', 3)
+    log = 'employee_id,timestamp\n' + ''.join(
+        f'{employee_id},2030-03-04T08:00:00\n{employee_id},2030-03-04T{10 + n:02}:00:00\n'
+        for n, employee_id in enumerate(organization.employee_ids)
+    )
+
+    bound = []
+    def listen(connection, cursor, statement, parameters, context, executemany):
+        if statement.startswith('DELETE FROM') and 'daily_attendance_summary' in statement:
+            bound.append(len(parameters))
+    event.listen(Engine, 'before_cursor_execute', listen)
+    try:
+        report = upload(client, organization, log).get_json()
+    finally:
+        event.remove(Engine, 'before_cursor_execute', listen)
+
+    assert report['shifts_created'] == 7
+    # three batches, each binding the dates and at most three employee ids
+    assert bound == [5, 5, 3]
+    summaries = tenant_rows(app, organization, select(
+        DailyAttendanceSummary.employee_id, DailyAttendanceSummary.worked_seconds
+    ).order_by(DailyAttendanceSummary.employee_id))
+    assert summaries == [(employee_id, (2 + n) * 3600)
+                         for n, employee_id in enumerate(organization.employee_ids)]
+
+
+def test_log_that_is_not_utf8_is_rejected(client, organization):
+    employee_id = organization.employee_ids[0]
+    # past the first buffer read along with the header
+    log = ('employee_id,timestamp\n' + f'{employee_id},2030-03-04T08:00:00\n' * 1000).encode()
+    log += b'\xff\xfe,x\n'
+    response = client.post('/attendance/import', headers=organization.headers(),
+                           data={'file': (io.BytesIO(log), 'punches.csv')},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'The punch log must be a UTF-8 CSV file'}
@@ -0,0 +1,55 @@
+from sqlalchemy import event
+
+from tunga_hr_app import db
+from tunga_hr_app.models import Invited_Users
+
+from .conftest import add_organization
+
+
+def add_invites(app, organization, invited_by, emails):
+    with app.app_context():
+        for email in emails:
+            db.session.add(Invited_Users(email=email, invited_by=invited_by,
+                                         organization_id=organization.organization_id))
+        db.session.commit()
+
+
+def test_invites_of_the_organization_are_paged(app, client, organization):
+    other = add_organization(app, name='Globex')
+    add_invites(app, organization, organization.admin_id, ['a@acme.test', 'b@acme.test'])
+    add_invites(app, other, other.admin_id, ['a@globex.test'])
+    # invites sent by any member belong to the organization
+    add_invites(app, organization, organization.employee_ids[0], ['c@acme.test'])
+
+    statements = []
+    with app.app_context():
+        engine = db.engines['public']
+    listen = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listen)
+    try:
+        first = client.get('/account/invited-users?limit=2', headers=organization.headers()).json
+    finally:
+        event.remove(engine, 'before_cursor_execute', listen)
+    assert len([statement for statement in statements if 'invited__users' in statement]) == 1
+
+    second = client.get('/account/invited-users', headers=organization.headers(),
+                        query_string={'limit': 2, 'cursor': first['next_cursor']}).json
+    assert second['next_cursor'] is None
+    assert [invite['email'] for invite in first['users'] + second['users']] == \
+        ['a@acme.test', 'b@acme.test', 'c@acme.test']
+    assert second['users'][0]['invited_by'] == organization.employee_ids[0]
+
+    response = client.get('/account/invited-users', headers=other.headers())
+    assert [invite['email'] for invite in response.json['users']] == ['a@globex.test']
+
+
+def test_invites_record_their_organization(app, client, organization):
+    response = client.post('/account/invite-users', headers=organization.headers(),
+                           json=[{'email': 'new@acme.test'}])
+    assert response.status_code == 200
+
+    response = client.get('/account/invited-users', headers=organization.headers())
+    assert [invite['email'] for invite in response.json['users']] == ['new@acme.test']
+    with app.app_context():
+        invite = db.session.get(Invited_Users, response.json['users'][0]['invite_id'])
+        assert invite.organization_id == organization.organization_id
@@ -0,0 +1,77 @@
+import io
+
+from sqlalchemy import func, select
+
+from tunga_hr_app import db
+from tunga_hr_app.models import Invited_Users
+
+
+def invite_csv(client, organization, content):
+    return client.post('/account/invite-users', headers=organization.headers(),
+                       data={'file': (io.BytesIO(content), 'invites.csv')},
+                       content_type='multipart/form-data')
+
+
+def invited_emails(app):
+    with app.app_context():
+        return sorted(db.session.scalars(select(Invited_Users.email)))
+
+
+def test_invites_are_deduplicated(app, client, organization):
+    response = client.post('/account/invite-users', headers=organization.headers(), json=[
+        {'email': 'New@Acme.test', 'job_title': 'Clerk', 'role': 'Employee'},
+        {'email': 'new@acme.test '},
+        {'email': 'USER1@acme.test'},
+        {'email': 'not-an-email'},
+        {'email': 'other@acme.test'}
+    ])
+
+    assert response.status_code == 200
+    assert response.json['invited'] == ['new@acme.test', 'other@acme.test']
+    assert response.json['skipped'] == [
+        {'email': 'new@acme.test', 'reason': 'Duplicate email'},
+        {'email': 'not-an-email', 'reason': 'Invalid email'},
+        {'email': 'user1@acme.test', 'reason': 'Already registered or invited'}
+    ]
+    assert invited_emails(app) == ['new@acme.test', 'other@acme.test']
+
+    response = client.post('/account/invite-users', headers=organization.headers(),
+                           json={'invites': [{'email': 'other@acme.test'}]})
+    assert response.json == {'invited': [], 'skipped': [
+        {'email': 'other@acme.test', 'reason': 'Already registered or invited'}]}
+
+
+def test_invites_from_a_csv_file(app, client, organization):
+    response = invite_csv(client, organization,
+                          '﻿email,job_title,role\nann@acme.test,Clerk,Employee\n'.encode())
+
+    assert response.status_code == 200
+    assert response.json['invited'] == ['ann@acme.test']
+    with app.app_context():
+        invite = db.session.scalars(select(Invited_Users)).one()
+        assert (invite.job_title, invite.role) == ('Clerk', 'Employee')
+        assert invite.organization_id == organization.organization_id
+
+
+def test_csv_that_is_not_utf8_is_rejected(app, client, organization):
+    response = invite_csv(client, organization, b'email,job_title\n\xff\xfe@x,y\n')
+
+    assert response.status_code == 400
+    assert response.json == {'error': 'The invites must be a UTF-8 CSV file'}
+    assert invited_emails(app) == []
+
+
+def test_invalid_bodies_are_rejected(client, organization):
+    response = client.post('/account/invite-users', headers=organization.headers(),
+                           json={'email': 'ann@acme.test'})
+    assert response.status_code == 400
+
+
+def test_too_many_invites(app, client, organization):
+    app.config['MAX_BULK_INVITES'] = 2
+    response = client.post('/account/invite-users', headers=organization.headers(),
+                           json=[{'email': f'{n}@acme.test'} for n in range(3)])
+
+    assert response.status_code == 400
+    with app.app_context():
+        assert db.session.scalar(select(func.count()).select_from(Invited_Users)) == 0
@@ -0,0 +1,65 @@
+def request_leave(client, headers, start, end, leave_type='Annual'):
+    return client.post('/leave/requests', headers=headers, json={
+        'leave_type': leave_type, 'start_date': start, 'end_date': end
+    })
+
+
+def annual_balance(client, headers, year):
+    response = client.get(f'/leave/balances?year={year}', headers=headers)
+    return next(balance for balance in response.get_json()['balances']
+                if balance['leave_type'] == 'Annual')
+
+
+def test_overlapping_leave_conflicts(client, organization):
+    headers = organization.headers(organization.employee_ids[0])
+
+    first = request_leave(client, headers, '2030-03-04', '2030-03-08')
+    assert first.status_code == 201
+
+    response = request_leave(client, headers, '2030-03-08', '2030-03-12')
+    assert response.status_code == 409
+    assert str(first.get_json()['leave_id']) in response.get_json()['error']
+
+    assert request_leave(client, headers, '2030-03-11', '2030-03-12').status_code == 201
+
+
+def test_leave_of_other_employees_does_not_conflict(client, organization):
+    for employee_id in organization.employee_ids[:2]:
+        response = request_leave(client, organization.headers(employee_id),
+                                 '2030-03-04', '2030-03-08')
+        assert response.status_code == 201
+
+
+def test_rejected_leave_frees_the_dates(client, organization):
+    headers = organization.headers(organization.employee_ids[0])
+    leave_id = request_leave(client, headers, '2030-03-04', '2030-03-08').get_json()['leave_id']
+
+    response = client.post(f'/leave/requests/{leave_id}/reject', headers=organization.headers())
+    assert response.status_code == 200
+
+    assert request_leave(client, headers, '2030-03-04', '2030-03-08').status_code == 201
+
+
+def test_leave_beyond_the_balance_conflicts(client, organization):
+    headers = organization.headers(organization.employee_ids[0])
+
+    response = request_leave(client, headers, '2030-03-04', '2030-03-08', 'Compassionate')
+    assert response.status_code == 409
+    assert annual_balance(client, headers, 2030)['pending_days'] == 0
+
+
+def test_leave_over_new_year_is_charged_to_each_year(client, organization):
+    headers = organization.headers(organization.employee_ids[0])
+
+    # four weekdays in 2030 and three in 2031
+    leave_id = request_leave(client, headers, '2030-12-26', '2031-01-03').get_json()['leave_id']
+    assert annual_balance(client, headers, 2030)['pending_days'] == 4
+    assert annual_balance(client, headers, 2031)['pending_days'] == 3
+
+    client.post(f'/leave/requests/{leave_id}/approve', headers=organization.headers())
+    assert annual_balance(client, headers, 2030)['used_days'] == 4
+    assert annual_balance(client, headers, 2031)['used_days'] == 3
+
+    client.post(f'/leave/requests/{leave_id}/cancel', headers=headers)
+    assert annual_balance(client, headers, 2030)['remaining_days'] == 21
+    assert annual_balance(client, headers, 2031)['remaining_days'] == 21
@@ -0,0 +1,25 @@
+def request_leave(client, headers, start, end):
+    response = client.post('/leave/requests', headers=headers, json={
+        'leave_type': 'Annual', 'start_date': start, 'end_date': end
+    })
+    assert response.status_code == 201
+    return response.json
+
+
+def test_leave_requests_are_listed_like_to_dict(client, organization):
+    employee_id = organization.employee_ids[0]
+    headers = organization.headers(employee_id)
+    created = [request_leave(client, headers, start, end) for start, end in
+               [('2030-01-07', '2030-01-08'), ('2030-02-04', '2030-02-05'), ('2030-03-04', '2030-03-05')]]
+
+    response = client.get('/leave/requests?limit=2', headers=headers)
+    assert response.status_code == 200
+    listed = response.json['leave_requests']
+
+    response = client.get('/leave/requests', headers=headers,
+                          query_string={'limit': 2, 'cursor': response.json['next_cursor']})
+    listed += response.json['leave_requests']
+    assert response.json['next_cursor'] is None
+
+    assert [leave['start_date'] for leave in listed] == ['2030-03-04', '2030-02-04', '2030-01-07']
+    assert listed == created[::-1]
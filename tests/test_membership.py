@@ -0,0 +1,48 @@
+from tunga_hr_app import db
+from tunga_hr_app.models import UserOrganization
+from tunga_hr_app.utils.cache import get_cache
+
+from .conftest import add_organization
+
+
+def balances(client, organization, user_id):
+    return client.get('/leave/balances', headers=organization.headers(user_id)).status_code
+
+
+def test_membership_is_cached(app, client, organization):
+    employee_id = organization.employee_ids[0]
+    assert balances(client, organization, employee_id) == 200
+
+    with app.app_context():
+        assert get_cache('membership').get(str(employee_id)) == {str(organization.organization_id)}
+
+
+def test_deleted_membership_is_invalidated(app, client, organization):
+    employee_id = organization.employee_ids[0]
+    assert balances(client, organization, employee_id) == 200
+
+    with app.app_context():
+        db.session.delete(db.session.get(UserOrganization, (employee_id, organization.organization_id)))
+        db.session.commit()
+
+    assert balances(client, organization, employee_id) == 403
+
+
+def test_bulk_deleted_memberships_are_invalidated(app, client, organization):
+    removed = organization.employee_ids[:2]
+    for employee_id in organization.employee_ids:
+        assert balances(client, organization, employee_id) == 200
+
+    with app.app_context():
+        UserOrganization.query.filter(UserOrganization.user_id.in_(removed)).delete()
+        db.session.commit()
+
+    for employee_id in organization.employee_ids:
+        assert balances(client, organization, employee_id) == (403 if employee_id in removed else 200)
+
+
+def test_members_of_another_tenant_are_rejected(app, client, organization):
+    other = add_organization(app, name='Other', employees=0)
+
+    response = client.get('/leave/balances', headers=organization.headers(other.admin_id))
+    assert response.status_code == 403
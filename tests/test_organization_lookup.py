@@ -0,0 +1,65 @@
+from sqlalchemy import event
+
+from tunga_hr_app import db
+from tunga_hr_app.models import User
+from tunga_hr_app.models.public import get_user_organization
+
+
+def lookups(app, user_ids):
+    """resolve the organization of each user in one request
+
+    returns:
+        tuple: the organization ids and the number of statements run
+    """
+    statements = []
+    with app.app_context():
+        engine = db.engines['public']
+    listen = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listen)
+    try:
+        with app.test_request_context():
+            organization_ids = [(get_user_organization(user_id) or {}).get('organization_id')
+                                for user_id in user_ids]
+    finally:
+        event.remove(engine, 'before_cursor_execute', listen)
+    return organization_ids, len(statements)
+
+
+def test_lookup_is_memoized_for_the_request(app, organization):
+    user_id = organization.employee_ids[0]
+    assert lookups(app, [user_id] * 3) == ([organization.organization_id] * 3, 1)
+
+
+def test_lookup_is_cached_across_requests(app, organization):
+    user_id = organization.employee_ids[0]
+    lookups(app, [user_id])
+    assert lookups(app, [user_id]) == ([organization.organization_id], 0)
+
+
+def test_user_helpers_share_the_lookup(app, organization):
+    with app.test_request_context():
+        user = db.session.get(User, organization.admin_id)
+        assert user.get_organization_id() == organization.organization_id
+        assert user.get_organization_name() == 'Acme'
+        assert user.get_organization() == get_user_organization(user.user_id)['organization_code']
+
+
+def test_user_without_an_organization(app, organization):
+    with app.app_context():
+        user = User({'first_name': 'Ada', 'last_name': 'Lone', 'email': 'ada@acme.test'})
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.user_id
+    assert lookups(app, [user_id]) == ([None], 1)
+
+
+def test_update_refreshes_organization_info(client, organization):
+    headers = organization.headers()
+    assert client.get('/account/organization-info', headers=headers).json['organization_name'] == 'Acme'
+
+    response = client.post('/account/update-organization', headers=headers,
+                           json={'organization_name': 'Acme Holdings'})
+    assert response.status_code == 200
+
+    response = client.get('/account/organization-info', headers=headers)
+    assert response.json['organization_name'] == 'Acme Holdings'
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+from tunga_hr_app import db
+from tunga_hr_app.models import User, UserOrganization
+
+from .conftest import add_organization
+
+
+def page_through(client, headers, url):
+    user_ids, cursor, pages = [], None, 0
+    while True:
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''), headers=headers)
+        assert response.status_code == 200
+        body = response.get_json()
+        user_ids += [user['user_id'] for user in body['users']]
+        cursor, pages = body['next_cursor'], pages + 1
+        if cursor is None:
+            return user_ids, pages
+
+
+def set_created_at(app, user_ids, created_at):
+    with app.app_context():
+        for user_id in user_ids:
+            db.session.get(User, user_id).created_at = created_at
+        db.session.commit()
+
+
+def test_pages_cover_every_user_once(app, client):
+    organization = add_organization(app, employees=10)
+    # ties on the sort key are broken by user_id
+    set_created_at(app, organization.user_ids[:6], datetime(2030, 1, 1))
+    set_created_at(app, organization.user_ids[6:], datetime(2030, 1, 2))
+
+    user_ids, pages = page_through(client, organization.headers(),
+                                   '/account/view-users?limit=4&fields=user_id')
+    assert user_ids == organization.user_ids
+    assert pages == 3
+
+    user_ids, _ = page_through(client, organization.headers(),
+                               '/account/view-users?limit=4&fields=user_id&sort=-created_at')
+    assert user_ids == organization.user_ids[6:][::-1] + organization.user_ids[:6][::-1]
+
+
+def test_pages_keep_their_place_when_users_are_added(app, client):
+    organization = add_organization(app, employees=5)
+    set_created_at(app, organization.user_ids, datetime(2030, 1, 1))
+    headers = organization.headers()
+
+    first = client.get('/account/view-users?limit=3&fields=user_id', headers=headers).get_json()
+
+    # a user sorted before the cursor must not shift the next page
+    with app.app_context():
+        user = User({'first_name': 'New', 'last_name': 'User', 'email': 'new@acme.test'})
+        user.created_at = datetime(2030, 1, 1) - timedelta(days=1)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(UserOrganization(user_id=user.user_id,
+                                        organization_id=organization.organization_id))
+        db.session.commit()
+
+    second = client.get(f"/account/view-users?limit=3&fields=user_id&cursor={first['next_cursor']}",
+                        headers=headers).get_json()
+    assert [user['user_id'] for user in first['users'] + second['users']] == organization.user_ids
+
+
+def test_invalid_page_arguments(client, organization):
+    headers = organization.headers()
+
+    for query in ('cursor=not-a-cursor', 'limit=0', 'limit=many', 'sort=password_hash'):
+        response = client.get(f'/account/view-users?{query}', headers=headers)
+        assert response.status_code == 400, query
+
+
+def set_users(app, user_ids, **values):
+    with app.app_context():
+        for user_id in user_ids:
+            for field, value in values.items():
+                setattr(db.session.get(User, user_id), field, value)
+        db.session.commit()
+
+
+def test_pages_sorted_by_role_and_flags(app, client):
+    organization = add_organization(app, employees=8)
+    headers = organization.headers()
+    admin, employees = organization.admin_id, organization.employee_ids
+    # users without a role sort first
+    set_users(app, employees[:3], role=None)
+    set_users(app, employees[::2], active=True)
+
+    user_ids, pages = page_through(client, headers, '/account/view-users?limit=2&fields=user_id&sort=role')
+    assert user_ids == employees[:3] + [admin] + employees[3:]
+    assert pages == 5
+
+    user_ids, _ = page_through(client, headers, '/account/view-users?limit=2&fields=user_id&sort=-role')
+    assert user_ids == (employees[:3] + [admin] + employees[3:])[::-1]
+
+    user_ids, _ = page_through(client, headers, '/account/view-users?limit=3&fields=user_id&sort=-active')
+    assert user_ids == employees[::2][::-1] + ([admin] + employees[1::2])[::-1]
+
+    set_users(app, employees[:2], verified=True)
+    user_ids, _ = page_through(client, headers, '/account/view-users?limit=1&fields=user_id&sort=verified')
+    assert user_ids == [admin] + employees[2:] + employees[:2]
+
+
+def test_filters_by_role_and_flags(app, client):
+    organization = add_organization(app, employees=4)
+    headers = organization.headers()
+    employees = organization.employee_ids
+    set_users(app, employees[:2], active=True)
+    set_users(app, employees[1:3], verified=True)
+
+    def listed(query):
+        return page_through(client, headers, f'/account/view-users?limit=2&fields=user_id&{query}')[0]
+
+    assert listed('role=Admin') == [organization.admin_id]
+    assert listed('role=Employee&active=true') == employees[:2]
+    assert listed('active=true&verified=yes') == employees[1:2]
+    assert listed('verified=0&sort=-created_at') == [employees[3], employees[0], organization.admin_id]
+    assert client.get('/account/view-users?active=maybe', headers=headers).status_code == 400
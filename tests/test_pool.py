@@ -0,0 +1,48 @@
+from flask import Flask
+
+from tunga_hr_app import db
+from tunga_hr_app.utils.pool import InstrumentedQueuePool, PoolStats, init_pool_options
+
+
+def test_pool_stats_are_for_operators_only(app, client, organization):
+    assert client.get('/account/pool-stats', headers=organization.headers()).status_code == 403
+
+    app.config['OPERATOR_EMAILS'] = ['user0@acme.test']
+    response = client.get('/account/pool-stats', headers=organization.headers())
+    assert response.status_code == 200
+
+    stats = response.get_json()['pools']
+    assert set(stats) == {'default', 'public'}
+    assert stats['default']['checkouts'] > 0
+    assert stats['default']['timeouts'] == 0
+
+
+def test_pools_are_instrumented(app):
+    with app.app_context():
+        assert isinstance(db.engine.pool, InstrumentedQueuePool)
+        assert db.engine.pool.size() == app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size']
+
+
+def test_in_memory_sqlite_gets_no_queue_pool_options():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://',
+                      SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 5, 'max_overflow': 10,
+                                                 'pool_timeout': 30, 'pool_recycle': 1800})
+    init_pool_options(app)
+
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS'] == {'pool_recycle': 1800}
+
+
+def test_checkout_waits_are_bucketed():
+    stats = PoolStats()
+    stats.record_checkout(0.0005, False)
+    stats.record_checkout(0.2, True)
+    stats.record_timeout()
+
+    result = stats.to_dict()
+    assert result['checkouts'] == 2
+    assert result['overflow_events'] == 1
+    assert result['timeouts'] == 1
+    assert result['wait_max'] == 0.2
+    assert result['wait_histogram']['0.001'] == 1
+    assert result['wait_histogram']['0.5'] == 1
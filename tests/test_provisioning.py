@@ -0,0 +1,104 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tunga_hr_app import db
+from tunga_hr_app.models import ProvisioningJob
+from tunga_hr_app.utils.database import Database
+from tunga_hr_app.utils.provisioning import (
+    claim_provisioning_job,
+    provision_tenant,
+    retryable_provisioning_jobs
+)
+
+REGISTRATION = {
+    'organization_name': 'Globex', 'country': 'Uganda', 'first_name': 'Ada',
+    'last_name': 'Admin', 'email': 'ada@globex.test', 'password': 'a-long-password'
+}
+
+
+@pytest.fixture
+def provisioned(monkeypatch):
+    """tenants whose schema was created, SQLite has no CREATE SCHEMA"""
+    tenants = []
+    monkeypatch.setattr(Database, 'create_tenant_schema',
+                        lambda database: tenants.append(database.schema))
+    return tenants
+
+
+def register(client):
+    response = client.post('/auth/register', json=REGISTRATION)
+    assert response.status_code == 202
+    return response.get_json()
+
+
+def job_status(client, registration):
+    return client.get(f"/auth/provisioning/{registration['provisioning_id']}",
+                      headers={'X-Provisioning-Token': registration['provisioning_token']})
+
+
+def test_registration_provisions_the_tenant(client, provisioned):
+    registration = register(client)
+
+    response = job_status(client, registration)
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'Complete'
+    assert provisioned == ['1']
+
+
+def test_status_needs_the_provisioning_token(client, provisioned):
+    registration = register(client)
+    url = f"/auth/provisioning/{registration['provisioning_id']}"
+
+    assert client.get(url).status_code == 403
+    assert client.get(url, headers={'X-Provisioning-Token': 'forged'}).status_code == 403
+
+
+def test_tasks_run_on_the_in_process_pool(app, client, provisioned):
+    # the thread pool stands in for a broker when CELERY_BROKER_URL is unset
+    app.config['TASKS_ALWAYS_EAGER'] = False
+    registration = register(client)
+
+    deadline = time.monotonic() + 5
+    while job_status(client, registration).get_json()['status'] != 'Complete':
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert provisioned == ['1']
+
+
+def test_failed_job_is_retried(app, client, monkeypatch):
+    def fail(database):
+        raise RuntimeError('schema details that must not leak')
+
+    monkeypatch.setattr(Database, 'create_tenant_schema', fail)
+    registration = register(client)
+
+    job = job_status(client, registration).get_json()
+    assert job['status'] == 'Failed'
+    assert 'schema details' not in job['error']
+
+    monkeypatch.setattr(Database, 'create_tenant_schema', lambda database: None)
+    with app.app_context():
+        assert retryable_provisioning_jobs() == [registration['provisioning_id']]
+        provision_tenant(registration['provisioning_id'])
+        assert retryable_provisioning_jobs() == []
+
+    assert job_status(client, registration).get_json()['status'] == 'Complete'
+
+
+def test_running_job_is_claimed_once_its_lease_expires(app, client, provisioned):
+    job_id = register(client)['provisioning_id']
+
+    with app.app_context():
+        job = db.session.get(ProvisioningJob, job_id)
+        job.status = 'Running'
+        db.session.commit()
+        assert retryable_provisioning_jobs() == []
+        assert claim_provisioning_job(job_id) is None
+
+        job.updated_at = datetime.now(timezone.utc) - timedelta(
+            seconds=app.config['PROVISIONING_LEASE_SECONDS'] + 1)
+        db.session.commit()
+        assert retryable_provisioning_jobs() == [job_id]
+        assert claim_provisioning_job(job_id).status == 'Running'
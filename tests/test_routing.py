@@ -0,0 +1,90 @@
+import os
+import shutil
+
+from flask import g
+from sqlalchemy import select
+
+from tunga_hr_app import db
+from tunga_hr_app.models import User, UserOrganization
+from tunga_hr_app.utils.routing import ReplicaSet, init_replicas
+
+from .conftest import SCHEMAS, database_uri
+
+
+def use_replica(app, uri):
+    app.config['SQLALCHEMY_REPLICA_URIS'] = [uri]
+    with app.app_context():
+        init_replicas(app)
+    return app.extensions['replicas']
+
+
+def copy_database(source, target):
+    """a replica that is in sync with the primary until the next write"""
+    os.makedirs(target)
+    for name in ('main',) + SCHEMAS:
+        shutil.copy(os.path.join(source, f'{name}.db'), target)
+    return database_uri(target)
+
+
+def add_member(app, organization):
+    with app.app_context():
+        user = User({'first_name': 'New', 'last_name': 'Hire', 'email': 'new@acme.test'})
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(UserOrganization(user_id=user.user_id,
+                                        organization_id=organization.organization_id))
+        db.session.commit()
+
+
+def listed_users(client, organization):
+    response = client.get('/account/view-users?fields=user_id', headers=organization.headers())
+    assert response.status_code == 200
+    return len(response.get_json()['users'])
+
+
+def test_read_only_views_read_from_the_replica(app, client, organization, tmp_path):
+    use_replica(app, copy_database(str(tmp_path), str(tmp_path / 'replica')))
+    add_member(app, organization)
+
+    # the replica has not seen the new member yet
+    assert listed_users(client, organization) == len(organization.user_ids)
+
+    # queries outside of read-only views stay on the primary
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).select_from(User)) == \
+            len(organization.user_ids) + 1
+
+
+def test_failed_replica_falls_back_to_the_primary(app, client, organization, tmp_path):
+    replicas = use_replica(app, database_uri(str(tmp_path / 'missing')))
+    add_member(app, organization)
+
+    assert listed_users(client, organization) == len(organization.user_ids) + 1
+    assert replicas.is_down(replicas.engines[0])
+
+
+def test_replicas_are_chosen_round_robin_skipping_failed_ones():
+    replicas = ReplicaSet(['first', 'second', 'third'], retry_after=60)
+    assert [replicas.choose() for _ in range(4)] == ['first', 'second', 'third', 'first']
+
+    replicas.mark_down('second')
+    assert [replicas.choose() for _ in range(3)] == ['third', 'first', 'third']
+
+    for replica in ('first', 'third'):
+        replicas.mark_down(replica)
+    assert replicas.choose() is None
+
+
+def test_session_reads_its_own_writes(app, organization, tmp_path):
+    use_replica(app, copy_database(str(tmp_path), str(tmp_path / 'replica')))
+
+    with app.test_request_context():
+        g.read_only = True
+        assert db.session.get_bind(clause=select(User)) is app.extensions['replicas'].engines[0]
+
+        db.session.add(User({'first_name': 'New', 'last_name': 'Hire', 'email': 'new@acme.test'}))
+        db.session.flush()
+        assert db.session.get_bind(mapper=User.__mapper__, clause=select(User)) is \
+            db.engines['public']
+        assert db.session.scalar(select(User).where(User.email == 'new@acme.test')) is not None
+        db.session.rollback()
@@ -0,0 +1,76 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from tunga_hr_app import db
+from tunga_hr_app.models import User
+from tunga_hr_app.utils import security
+from tunga_hr_app.utils.security import (
+    HashingPoolBusy,
+    hash_password,
+    needs_rehash,
+    verify_password
+)
+
+PASSWORD = 'a-long-password'
+
+
+@pytest.fixture
+def hashing_pool(app):
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0)
+    yield
+    security._shutdown_pool()
+    security._pool = security._slots = None
+
+
+def set_password_hash(app, user_id, password_hash):
+    with app.app_context():
+        db.session.get(User, user_id).password_hash = password_hash
+        db.session.commit()
+
+
+def login(client, email, password=PASSWORD):
+    return client.post('/auth/login', json={'email': email, 'password': password})
+
+
+def test_outdated_hash_is_upgraded_on_login(app, client, organization):
+    set_password_hash(app, organization.admin_id,
+                      generate_password_hash(PASSWORD, 'pbkdf2:sha256:1000'))
+
+    assert login(client, 'user0@acme.test').status_code == 200
+
+    with app.app_context():
+        password_hash = db.session.get(User, organization.admin_id).password_hash
+        assert not needs_rehash(password_hash)
+        assert verify_password(password_hash, PASSWORD)
+    assert login(client, 'user0@acme.test', 'wrong').status_code == 401
+
+
+def test_short_method_names_match_their_full_form(app):
+    app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+    with app.app_context():
+        assert not needs_rehash(generate_password_hash(PASSWORD, 'scrypt:32768:8:1'))
+        assert needs_rehash(generate_password_hash(PASSWORD, 'scrypt:16384:8:1'))
+
+
+def test_hashes_are_made_on_the_pool(app, hashing_pool):
+    with app.app_context():
+        password_hash = hash_password(PASSWORD)
+        assert verify_password(password_hash, PASSWORD)
+        assert security._pool is not None
+
+
+def test_full_pool_rejects_at_once(app, client, organization, hashing_pool):
+    set_password_hash(app, organization.admin_id, generate_password_hash(PASSWORD))
+
+    with app.app_context():
+        _, slots = security._get_pool()
+    assert slots.acquire(blocking=False)
+    try:
+        with app.app_context(), pytest.raises(HashingPoolBusy):
+            hash_password(PASSWORD)
+
+        response = login(client, 'user0@acme.test')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+    finally:
+        slots.release()
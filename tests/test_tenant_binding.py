@@ -0,0 +1,89 @@
+from flask import g
+from sqlalchemy import select
+
+from tunga_hr_app.models.tenant import LeaveRequest
+from tunga_hr_app.utils import database
+from tunga_hr_app.utils.database import get_tenant_registry
+
+from .conftest import add_organization
+
+
+class FakeConnection:
+    """DBAPI connection recording the statements run on it"""
+
+    def __init__(self):
+        self.statements = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, statement):
+        self.statements.append(statement)
+
+    def close(self):
+        pass
+
+    def commit(self):
+        pass
+
+
+class FakeRecord:
+    def __init__(self):
+        self.info = {}
+
+
+def test_requests_read_and_write_their_own_tenant(app, client):
+    first = add_organization(app, name='First')
+    second = add_organization(app, name='Second')
+
+    for organization in (first, second):
+        response = client.post('/leave/requests', headers=organization.headers(), json={
+            'leave_type': 'Annual', 'start_date': '2030-03-04', 'end_date': '2030-03-05'
+        })
+        assert response.status_code == 201
+
+    for organization in (first, second):
+        response = client.get('/leave/requests', headers=organization.headers())
+        assert [leave['employee_id'] for leave in response.get_json()['leave_requests']] == \
+            [organization.admin_id]
+
+        with app.app_context():
+            engine = get_tenant_registry().get(str(organization.organization_id))[0]
+            with engine.connect() as connection:
+                assert connection.execute(select(LeaveRequest.employee_id)).scalars().all() == \
+                    [organization.admin_id]
+
+
+def test_search_path_is_set_only_when_the_tenant_changes(app):
+    connection, record = FakeConnection(), FakeRecord()
+
+    with app.test_request_context():
+        database._search_path_connect(connection, record)
+
+        g.tenant_schema = '1'
+        database._search_path_checkout(connection, record, None)
+        database._search_path_checkout(connection, record, None)
+        assert connection.statements == ['SET search_path TO "1"']
+
+        g.tenant_schema = '2'
+        database._search_path_checkout(connection, record, None)
+        assert connection.statements[-1] == 'SET search_path TO "2"'
+
+        database._search_path_checkin(connection, record)
+        assert connection.statements[-1] == 'SET search_path TO DEFAULT'
+        assert record.info['search_path'] is None
+
+
+def test_rolled_back_search_path_is_set_again(app):
+    connection, record = FakeConnection(), FakeRecord()
+
+    with app.test_request_context():
+        g.tenant_schema = '1'
+        database._search_path_checkout(connection, record, None)
+
+        # a search_path changed inside a transaction that is rolled back
+        record.info['search_path_pending'] = True
+        database._search_path_reset(connection, record, None)
+        database._search_path_checkout(connection, record, None)
+
+    assert connection.statements == ['SET search_path TO "1"'] * 2
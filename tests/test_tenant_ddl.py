@@ -0,0 +1,29 @@
+from sqlalchemy.dialects import postgresql
+
+from tunga_hr_app import db
+from tunga_hr_app.utils.database import TENANT_PLACEHOLDER, get_tenant_ddl, get_tenant_head
+
+
+def test_script_stamps_the_tenant_at_head(app):
+    with app.app_context():
+        ddl = get_tenant_ddl(postgresql.dialect())
+        head = get_tenant_head()
+
+    assert ddl.startswith(f'CREATE SCHEMA IF NOT EXISTS {TENANT_PLACEHOLDER};')
+    assert ddl.rstrip().endswith(f"INSERT INTO alembic_version (version_num) VALUES ('{head}');")
+
+
+def test_script_creates_every_tenant_table_and_index(app):
+    with app.app_context():
+        ddl = get_tenant_ddl(postgresql.dialect())
+
+    for table in db.metadatas[None].tables.values():
+        assert f'CREATE TABLE {table.name} (' in ddl
+        for index in table.indexes:
+            assert f'CREATE INDEX {index.name} ' in ddl or \
+                f'CREATE UNIQUE INDEX {index.name} ' in ddl, index.name
+
+
+def test_script_is_generated_once_per_revision(app):
+    with app.app_context():
+        assert get_tenant_ddl(postgresql.dialect()) is get_tenant_ddl(postgresql.dialect())
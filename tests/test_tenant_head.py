@@ -0,0 +1,58 @@
+import os
+import shutil
+
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+
+from tunga_hr_app.utils.database import Database, get_tenant_head, get_tenant_registry
+
+REVISION = '''revision = 'f00dfeed0001'
+down_revision = '{head}'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    pass
+
+
+def downgrade():
+    pass
+'''
+
+
+def test_head_is_resolved_in_process(app, monkeypatch):
+    def popen(*args, **kwargs):
+        raise AssertionError('the head must not be read from a subprocess')
+
+    monkeypatch.setattr(os, 'popen', popen)
+    with app.app_context():
+        assert get_tenant_head() == \
+            ScriptDirectory(app.config['TENANT_MIGRATIONS_DIR']).get_current_head()
+
+
+def test_head_is_refreshed_when_a_revision_is_added(app, tmp_path):
+    directory = tmp_path / 'tenant'
+    shutil.copytree(app.config['TENANT_MIGRATIONS_DIR'], directory,
+                    ignore=shutil.ignore_patterns('__pycache__'))
+    app.config['TENANT_MIGRATIONS_DIR'] = str(directory)
+
+    with app.app_context():
+        head = get_tenant_head()
+        (directory / 'versions' / 'f00dfeed0001_.py').write_text(REVISION.format(head=head))
+        # make sure the directory looks changed on coarse grained file systems
+        stat = os.stat(directory / 'versions')
+        os.utime(directory / 'versions', ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        assert get_tenant_head() == 'f00dfeed0001'
+
+
+def test_tenant_is_stamped_with_the_head(app):
+    with app.app_context():
+        engine = get_tenant_registry().get('1')[0]
+        with engine.begin() as connection:
+            Database('1').migrate_tenant_schema(connection)
+
+        with engine.connect() as connection:
+            assert connection.execute(text('SELECT version_num FROM "1".alembic_version')) \
+                .scalar() == get_tenant_head()
@@ -0,0 +1,90 @@
+import pickle
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, update
+
+from tunga_hr_app import db
+from tunga_hr_app.models import User
+from tunga_hr_app.models.public import invalidate_user, load_user
+from tunga_hr_app.utils.cache import get_cache
+
+
+class SharedBackend:
+    """in-memory stand-in for redis"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+def change_user(app, user_id, **values):
+    """change a user the way another worker would, without invalidating"""
+    values['updated_at'] = datetime.now(timezone.utc) + timedelta(seconds=1)
+    with app.app_context():
+        db.session.execute(update(User).where(User.user_id == user_id).values(**values))
+        db.session.commit()
+
+
+def loaded(app, user_id):
+    with app.test_request_context():
+        user = load_user(user_id)
+        return user and (user.first_name, user.role, user.active)
+
+
+def test_snapshot_is_served_across_requests(app, organization):
+    statements = []
+    with app.app_context():
+        engine = db.engines['public']
+    listen = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listen)
+    try:
+        for _ in range(3):
+            assert loaded(app, organization.admin_id) == ('First0', 'Admin', False)
+    finally:
+        event.remove(engine, 'before_cursor_execute', listen)
+
+    # the row is loaded once, later requests only read its updated_at
+    assert sum('first_name' in statement for statement in statements) == 1
+
+
+def test_changes_of_other_workers_are_seen_at_once(app, organization):
+    assert loaded(app, organization.admin_id) == ('First0', 'Admin', False)
+
+    change_user(app, organization.admin_id, role='Employee', active=True)
+    assert loaded(app, organization.admin_id) == ('First0', 'Employee', True)
+
+
+def test_demoted_admin_loses_admin_rights(app, client, organization):
+    headers = organization.headers()
+    assert client.get('/account/view-users', headers=headers).status_code == 200
+    # there is no such request, but the admin is allowed to look for it
+    assert client.post('/leave/requests/1/approve', headers=headers).status_code == 409
+
+    change_user(app, organization.admin_id, role='Employee')
+    assert client.post('/leave/requests/1/approve', headers=headers).status_code == 403
+
+
+def test_missing_user_is_not_cached(app):
+    assert loaded(app, 12345) is None
+
+
+def test_shared_snapshots_are_invalidated(app, organization):
+    backend = SharedBackend()
+    with app.app_context():
+        get_cache('user').backend = backend
+
+    assert loaded(app, organization.admin_id) == ('First0', 'Admin', False)
+    assert pickle.loads(backend.values[f'user:{organization.admin_id}'])['role'] == 'Admin'
+
+    change_user(app, organization.admin_id, role='Employee')
+    with app.app_context():
+        invalidate_user(organization.admin_id)
+    assert loaded(app, organization.admin_id) == ('First0', 'Employee', False)
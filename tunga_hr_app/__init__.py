@@ -11,11 +11,12 @@ from flask_cors import CORS
 from flask_mail import Mail
 
 from config import config
+from .utils.routing import RoutingSession
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '.env'))
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 mail = Mail()
@@ -27,6 +28,9 @@ def create_app(config_name):
     
     config[config_name].init_app(app)
 
+    from .utils.pool import init_pool_options
+    init_pool_options(app)
+
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
@@ -39,10 +43,25 @@ def create_app(config_name):
         # Import blueprints from all modules
         from .account import account as account_blueprint
         from .auth import auth as auth_blueprint
+        from .attendance import attendance as attendance_blueprint
+        from .leave import leave as leave_blueprint
 
         # Register the blueprints with the application object
         app.register_blueprint(account_blueprint, url_prefix='/account')
         app.register_blueprint(auth_blueprint, url_prefix='/auth')
+        app.register_blueprint(attendance_blueprint, url_prefix='/attendance')
+        app.register_blueprint(leave_blueprint, url_prefix='/leave')
+
+        from .utils.database import init_tenant_binding, get_tenant_head
+        init_tenant_binding(app)
+        get_tenant_head()
+
+        from .utils.routing import init_replicas
+        init_replicas(app)
+
+        if app.config['CELERY_BROKER_URL']:
+            from .utils.tasks import celery_init_app
+            celery_init_app(app)
 
         if not app.debug and not app.testing:
             if app.config['LOG_TO_STDOUT']:
@@ -1,3 +1,6 @@
+import csv
+import io
+
 import psycopg2
 from . import account
 
@@ -6,16 +9,48 @@ from flask_jwt_extended import (
     jwt_required
 )
 
-from flask import request, jsonify, make_response
+from flask import request, jsonify, make_response, current_app
 
 from tunga_hr_app import db
 
 from marshmallow import ValidationError
+from sqlalchemy import func, insert, select, union
 from sqlalchemy.exc import IntegrityError
 
-from .email import send_invite_user_email, send_password_reset_email
-from ..models.public import User, Organization, Invited_Users, UserOrganization
-from ..utils.middleware import change_tenant_schema
+from .email import send_invite_user_email, send_invite_user_emails, send_password_reset_email
+from ..models.public import (
+    User, 
+    Organization, 
+    Invited_Users, 
+    UserOrganization, 
+    load_user, 
+    invalidate_user,
+    get_user_organization,
+    invalidate_organization
+)
+from ..utils.middleware import change_tenant_schema, invalidate_membership
+from ..utils.database import get_tenant_registry
+from ..utils.export import EXPORT_FORMATS, export_response
+from ..utils.http import add_validators, make_etag, not_modified
+from ..utils.pagination import InvalidPageArgument, get_bool_arg, get_limit, keyset_page
+from ..utils.pool import pool_stats
+from ..utils.routing import read_only
+from ..email import mail_metrics
+
+# Fields /view-users can return and sort by, and fields of the invite listings
+USER_LIST_FIELDS = ['user_id', 'first_name', 'last_name', 'job_title', 'email', 
+                    'phone_number', 'active', 'verified', 'role', 'created_at']
+# a missing role sorts as '' since the keyset cursor cannot compare NULLs
+USER_SORT_KEYS = {
+    'created_at': User.created_at,
+    'first_name': User.first_name,
+    'last_name': User.last_name,
+    'role': func.coalesce(User.role, '').label('role_sort_key'),
+    'active': User.active,
+    'verified': User.verified
+}
+INVITE_LIST_FIELDS = ['invite_id', 'email', 'job_title', 'role', 'invited_by', 
+                        'created_at', 'updated_at']
 
 
 @account.before_request
@@ -30,7 +65,7 @@ def before_request():
         response.headers['Access-Control-Allow-Credentials'] = 'true'
         response.status_code = 200
         return response  
-    change_tenant_schema()
+    return change_tenant_schema()
 
 
 @account.route('/validate-account/<token>', methods=['GET', 'POST'])
@@ -48,6 +83,8 @@ def validate_account(token):
     organization = db.session.get(Organization, user.get_organization_id())
     organization.active = True
     db.session.commit()
+    invalidate_user(user.user_id)
+    invalidate_organization(organization.organization_id)
 
     return jsonify({'message': 'Account successfully validated'}), 200
 
@@ -60,30 +97,118 @@ def invite_user():
     request_data = request.get_json()
 
     try:
+        logged_user = load_user(current_user)
+
         invited_user = Invited_Users(
            email = request_data['email'],
            job_title = request_data.get('job_title'),
            role = request_data.get('role'), 
-           invited_by = current_user
+           invited_by = current_user,
+           organization_id = logged_user.get_organization_id()
         )
         db.session.add(invited_user)
-        db.session.commit()
-
-        logged_user = User.query.filter_by(user_id=current_user).first()
 
         send_invite_user_email(
             invited_user=invited_user, 
             organization_id=logged_user.get_organization_id(),
             organization_name=logged_user.get_organization_name()
         )
+        db.session.commit()
 
-    except Exception as e:
-        print(f"Error inviting user: {e}")
-        return jsonify({'error': e}), 400
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Inviting a user failed')
+        return jsonify({'error': 'The user could not be invited, check the email, job_title and role'}), 400
 
     return jsonify({'message': 'Email invite successfully sent'}), 200
 
 
+def read_bulk_invites():
+    """Read invites from a JSON array or an uploaded CSV file with an
+    email, job_title and role header
+
+    the CSV file is read lazily, decoding errors surface while iterating
+
+    raises:
+        ValueError: when the JSON body is not a list of invite objects
+    """
+    if 'file' in request.files:
+        stream = io.TextIOWrapper(request.files['file'].stream, encoding='utf-8-sig')
+        return csv.DictReader(stream)
+
+    request_data = request.get_json(silent=True)
+    if isinstance(request_data, dict):
+        request_data = request_data.get('invites')
+    if not isinstance(request_data, list) or \
+            not all(isinstance(row, dict) for row in request_data):
+        raise ValueError('Send the invites as a list of objects with an email, job_title and role')
+    return request_data
+
+
+@account.route('/invite-users', methods=['POST'])
+@jwt_required()
+def invite_users():
+    current_user = get_jwt_identity()
+
+    organization = get_user_organization(current_user)
+    if not organization:
+        return jsonify({'message': 'Organization not found for the current user.'}), 404
+
+    try:
+        rows = read_bulk_invites()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    max_invites = current_app.config['MAX_BULK_INVITES']
+    invites, skipped = {}, []
+
+    try:
+        for row in rows:
+            email = (row.get('email') or '').strip().lower()
+            if '@' not in email:
+                skipped.append({'email': email, 'reason': 'Invalid email'})
+            elif email in invites:
+                skipped.append({'email': email, 'reason': 'Duplicate email'})
+            else:
+                invites[email] = {
+                    'email': email,
+                    'job_title': row.get('job_title') or None,
+                    'role': row.get('role') or None,
+                    'invited_by': current_user,
+                    'organization_id': organization['organization_id']
+                }
+            if len(invites) > max_invites:
+                return jsonify({'error': f'At most {max_invites} users can be invited at once'}), 400
+    except (UnicodeDecodeError, csv.Error):
+        return jsonify({'error': 'The invites must be a UTF-8 CSV file'}), 400
+
+    # Emails already registered or invited in any case, in one query
+    if invites:
+        existing = set(db.session.scalars(union(
+            select(func.lower(User.email)).where(func.lower(User.email).in_(invites)),
+            select(func.lower(Invited_Users.email))
+            .where(func.lower(Invited_Users.email).in_(invites))
+        )))
+        for email in existing:
+            invites.pop(email, None)
+            skipped.append({'email': email, 'reason': 'Already registered or invited'})
+
+    if invites:
+        db.session.execute(insert(Invited_Users).values(list(invites.values())))
+
+        send_invite_user_emails(
+            invited_users=[Invited_Users(**invite) for invite in invites.values()],
+            organization_id=organization['organization_id'],
+            organization_name=organization['organization_name']
+        )
+        db.session.commit()
+
+    return jsonify({
+        'invited': list(invites),
+        'skipped': skipped
+    }), 200
+
+
 @account.route('/join-organization/<token>', methods=['POST'])
 def join_organization(token):
 
@@ -109,6 +234,8 @@ def join_organization(token):
         db.session.query(Invited_Users).filter_by(email=token_payload['email']).delete()
         db.session.commit()
 
+        invalidate_membership(user.user_id)
+
     except IntegrityError as e:
         db.session.rollback()
         if isinstance(e.orig, psycopg2.errors.UniqueViolation):
@@ -119,57 +246,90 @@ def join_organization(token):
     return jsonify({'message': 'Account successfylly created'}), 200
 
 
+def filter_users(query):
+    """apply the role, active and verified filters of the request"""
+    if request.args.get('role'):
+        query = query.where(User.role == request.args['role'])
+    for flag in ('active', 'verified'):
+        value = get_bool_arg(flag)
+        if value is not None:
+            query = query.where(getattr(User, flag) == value)
+    return query
+
+
 @account.route('/view-users', methods=['GET'])
 @jwt_required()
+@read_only
 def view_users():
     current_user = get_jwt_identity()
 
-    user_organization = UserOrganization.query.filter_by(user_id=current_user).first()
+    user_organization = get_user_organization(current_user)
     
     if not user_organization:
         return jsonify({'message': 'Organization not found for the current user.'}), 404
     
-    organization_id = user_organization.organization_id
-    
-    users = db.session.query(User).join(UserOrganization, User.user_id == UserOrganization.user_id).filter(UserOrganization.organization_id == organization_id).all()
+    organization_id = user_organization['organization_id']
+
+    # Any change to the organization's users moves the newest updated_at or
+    # the headcount, so both validate every page and projection
+    last_modified, headcount = db.session.execute(
+        select(func.max(User.updated_at), func.count())
+        .join(UserOrganization, User.user_id == UserOrganization.user_id)
+        .where(UserOrganization.organization_id == organization_id)
+    ).one()
+    etag = make_etag('users', organization_id, last_modified, headcount, request.query_string)
+    response = not_modified(etag, last_modified)
+    if response:
+        return response
+
+    try:
+        fields = request.args.get('fields')
+        fields = fields.split(',') if fields else USER_LIST_FIELDS
+        if set(fields) - set(USER_LIST_FIELDS):
+            raise InvalidPageArgument(f"fields must be among {', '.join(USER_LIST_FIELDS)}")
+
+        sort = request.args.get('sort', 'created_at')
+        descending = sort.startswith('-')
+        if sort.lstrip('-') not in USER_SORT_KEYS:
+            raise InvalidPageArgument(f"sort must be one of {', '.join(USER_SORT_KEYS)}")
+        keys = [USER_SORT_KEYS[sort.lstrip('-')], User.user_id]
 
-    user_list = [{
-        'user_id': user.user_id,
-        'first_name': user.first_name,
-        'last_name': user.last_name,
-        'job_title': user.job_title,
-        'email': user.email,
-        'phone_number': user.phone_number,
-        'active': user.active,
-        'verified': user.verified,
-        'role': user.role,
-        'created_at': user.created_at
-    } for user in users]
+        columns = dict.fromkeys(keys + [getattr(User, field) for field in fields])
+        query = (select(*columns)
+                 .join(UserOrganization, User.user_id == UserOrganization.user_id)
+                 .where(UserOrganization.organization_id == organization_id))
 
-    return jsonify({'users': user_list}), 200
+        users, next_cursor = keyset_page(filter_users(query), keys, request.args.get('cursor'),
+                                         get_limit(), descending)
+    except InvalidPageArgument as e:
+        return jsonify({'error': str(e)}), 400
+
+    user_list = [{field: user._mapping[field] for field in fields} for user in users]
+
+    return add_validators(jsonify({'users': user_list, 'next_cursor': next_cursor}),
+                          etag, last_modified), 200
 
 
 @account.route('/invited-users', methods=['GET'])
 @jwt_required()
+@read_only
 def invited_users():
     current_user_id = get_jwt_identity()
     
-    user_org = UserOrganization.query.filter_by(user_id=current_user_id).first()
+    user_org = get_user_organization(current_user_id)
     
     if not user_org:
         return jsonify({"message": "Organization not found"}), 404
     
-    organization_id = user_org.organization_id
+    try:
+        query = (select(*[getattr(Invited_Users, field) for field in INVITE_LIST_FIELDS])
+                 .where(Invited_Users.organization_id == user_org['organization_id']))
+
+        invites, next_cursor = keyset_page(query, [Invited_Users.invite_id], 
+                                           request.args.get('cursor'), get_limit())
+    except InvalidPageArgument as e:
+        return jsonify({'error': str(e)}), 400
 
-    invited_by_user = Invited_Users.query.filter_by(invited_by=current_user_id).all()
-    
-    invited_in_org = (Invited_Users.query
-                      .join(UserOrganization, UserOrganization.user_id == Invited_Users.invited_by)
-                      .filter(UserOrganization.organization_id == organization_id)
-                      .all())
-    
-    invited_users = {invite.invite_id: invite for invite in invited_by_user + invited_in_org}.values()
-    
     invited_users_list = [
         {
             "invite_id": invite.invite_id,
@@ -179,23 +339,75 @@ def invited_users():
             "invited_by": invite.invited_by,
             "created_at": invite.created_at.isoformat(),
             "updated_at": invite.updated_at.isoformat()
-        } for invite in invited_users
+        } for invite in invites
     ]
     
-    return jsonify({'users': invited_users_list}), 200
+    return jsonify({'users': invited_users_list, 'next_cursor': next_cursor}), 200
+
+
+@account.route('/export/users', methods=['GET'])
+@jwt_required()
+@read_only
+def export_users():
+    user_organization = get_user_organization(get_jwt_identity())
+
+    if not user_organization:
+        return jsonify({'message': 'Organization not found for the current user.'}), 404
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+    try:
+        query = filter_users(
+            select(*[getattr(User, field) for field in USER_LIST_FIELDS])
+            .join(UserOrganization, User.user_id == UserOrganization.user_id)
+            .where(UserOrganization.organization_id == user_organization['organization_id'])
+            .order_by(User.created_at, User.user_id)
+        )
+    except InvalidPageArgument as e:
+        return jsonify({'error': str(e)}), 400
+
+    return export_response(query, USER_LIST_FIELDS, 'users', export_format)
+
+
+@account.route('/export/invites', methods=['GET'])
+@jwt_required()
+@read_only
+def export_invites():
+    user_organization = get_user_organization(get_jwt_identity())
+
+    if not user_organization:
+        return jsonify({'message': 'Organization not found for the current user.'}), 404
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+    query = (select(*[getattr(Invited_Users, field) for field in INVITE_LIST_FIELDS])
+             .where(Invited_Users.organization_id == user_organization['organization_id'])
+             .order_by(Invited_Users.invite_id))
+
+    return export_response(query, INVITE_LIST_FIELDS, 'invites', export_format)
 
 
 @account.route('/view-user', methods=['GET'])
 @jwt_required()
+@read_only
 def view_user():
     current_user = get_jwt_identity()
 
-    user = db.session.query(User).filter_by(user_id=current_user).first()
+    user = load_user(current_user)
 
     if not user:
         return jsonify({'message': 'You are not registered'}), 403
+
+    etag = make_etag('user', user.user_id, user.updated_at)
+    response = not_modified(etag, user.updated_at)
+    if response:
+        return response
     
-    return jsonify(
+    return add_validators(jsonify(
         {
             'user_id': user.user_id,
             'first_name': user.first_name,
@@ -206,30 +418,31 @@ def view_user():
             'active': user.active,
             'created_at': user.created_at
         }
-    ), 200
+    ), etag, user.updated_at), 200
 
 
 @account.route('/organization-info', methods=['GET'])
 @jwt_required()
+@read_only
 def orgnization_info():
     current_user = get_jwt_identity()
 
-    user_organization = UserOrganization.query.filter_by(user_id=current_user).first()
+    organization = get_user_organization(current_user)
 
-    if not user_organization:
+    if not organization:
         return jsonify({"message": "You do not have permission to view this information"}), 403
-    
-    organization = db.session.query(Organization).filter_by(organization_id=user_organization.organization_id).first()
 
-    if not organization:
-        return jsonify({"message": "Organization not found"}), 404
+    etag = make_etag('organization', organization['organization_id'], organization['updated_at'])
+    response = not_modified(etag, organization['updated_at'])
+    if response:
+        return response
 
-    return jsonify({
-        'organization_name': organization.organization_name,
-        'country': organization.country, 
-        'organization_code': organization.organization_code,
-        'created_at': organization.created_at
-    }), 200
+    return add_validators(jsonify({
+        'organization_name': organization['organization_name'],
+        'country': organization['country'], 
+        'organization_code': organization['organization_code'],
+        'created_at': organization['created_at']
+    }), etag, organization['updated_at']), 200
 
 
 @account.route('/update-user/<user_id>', methods=['PATCH'])
@@ -252,6 +465,8 @@ def update_user(user_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": "An error occurred while updating the user", "error": str(e)}), 500
+
+    invalidate_user(user_id)
     
     return jsonify({"message": "User updated successfully"}), 200
 
@@ -265,6 +480,7 @@ def deactivate_user(user_id):
             return jsonify({'message': 'User is already deactivated'}), 400
         user.active = False
         db.session.commit()
+        invalidate_user(user_id)
     except Exception as e:
         return jsonify({'error': e}), 400
 
@@ -280,6 +496,7 @@ def reactivate_user(user_id):
             return jsonify({'message': 'User is already active'}), 400
         user.active = True
         db.session.commit()
+        invalidate_user(user_id)
     except Exception as e:
         return jsonify({'error': e}), 400
 
@@ -296,6 +513,7 @@ def send_passowrd_reset_email():
         return jsonify({'message': 'No account associated with this email'}), 400
     
     send_password_reset_email(user)
+    db.session.commit()
 
     return jsonify({'message': 'Password reset email sent'}), 200
 
@@ -311,6 +529,7 @@ def reset_password(token):
     
     user.set_password(password)
     db.session.commit()
+    invalidate_user(user.user_id)
 
     return jsonify({'message': 'Password reset successfully'}), 200
 
@@ -320,13 +539,13 @@ def reset_password(token):
 def update_organization():
     current_user = get_jwt_identity()
     
-    user_organization = UserOrganization.query.filter_by(user_id=current_user).first()
+    user_organization = get_user_organization(current_user)
     if not user_organization:
         return jsonify({"message": "You do not have permission to update this organization"}), 403
     
     payload = request.get_json()
 
-    organization = db.session.query(Organization).filter_by(organization_id=user_organization.organization_id).first()
+    organization = db.session.get(Organization, user_organization['organization_id'])
 
     if not organization:
         return jsonify({"message": "Organization not found"}), 404
@@ -341,4 +560,25 @@ def update_organization():
         db.session.rollback()
         return jsonify({"message": "An error occurred while updating the organization", "error": str(e)}), 500
 
-    return jsonify({"message": "Organization updated successfully"}), 200
\ No newline at end of file
+    invalidate_organization(organization.organization_id)
+
+    return jsonify({"message": "Organization updated successfully"}), 200
+
+
+@account.route('/pool-stats', methods=['GET'])
+@jwt_required()
+def view_pool_stats():
+    current_user = get_jwt_identity()
+
+    user = load_user(current_user)
+
+    # the statistics cover every tenant of the deployment, so they are shown
+    # to operators rather than to the admins of an organization
+    if not user or user.email.lower() not in current_app.config['OPERATOR_EMAILS']:
+        return jsonify({"message": "You do not have permission to view this information"}), 403
+
+    return jsonify({
+        'pools': pool_stats(),
+        'tenants': get_tenant_registry().stats(),
+        'mail': mail_metrics()
+    }), 200
@@ -0,0 +1,267 @@
+"""Attendance log import
+
+loads the punch logs of attendance devices from CSV (employee_id,
+timestamp and an optional in/out direction). Rows are validated in chunks
+as they are read and loaded into a temporary staging table, with COPY on
+PostgreSQL, then merged into the attendance table of the tenant by a few
+set-based statements that drop repeated punches and pair them into shifts.
+"""
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import DateTime, text
+
+from tunga_hr_app import db
+
+from .rollups import rebuild_rollups
+from ..utils.database import current_tenant_schema, quote_schema
+
+REQUIRED_COLUMNS = ('employee_id', 'timestamp')
+
+DIRECTIONS = {'': None, 'in': 'in', 'out': 'out', 'i': 'in', 'o': 'out'}
+
+STAGING_TABLE = (
+    "CREATE TEMPORARY TABLE attendance_import ("
+    "employee_id INTEGER NOT NULL, punched_at TIMESTAMP NOT NULL, direction VARCHAR(3))"
+)
+
+# Distinct punches of the import without the repeated taps that follow a
+# punch within the dedupe window, numbered per employee and paired with the
+# punches around them. Punches without a direction alternate in and out.
+PUNCHES_TABLE = """
+CREATE TEMPORARY TABLE attendance_import_punches AS
+WITH distinct_punches AS (
+    SELECT employee_id, punched_at, MAX(direction) AS direction
+    FROM attendance_import
+    GROUP BY employee_id, punched_at
+), ordered AS (
+    SELECT employee_id, punched_at, direction,
+           LAG(punched_at) OVER (PARTITION BY employee_id ORDER BY punched_at) AS previous_at
+    FROM distinct_punches
+), kept AS (
+    SELECT employee_id, punched_at, direction,
+           ROW_NUMBER() OVER (PARTITION BY employee_id ORDER BY punched_at) AS n
+    FROM ordered
+    WHERE previous_at IS NULL OR {outside_window}
+), directed AS (
+    SELECT employee_id, punched_at, n,
+           COALESCE(direction, CASE WHEN n % 2 = 1 THEN 'in' ELSE 'out' END) AS direction
+    FROM kept
+)
+SELECT employee_id, punched_at, direction, n,
+       LAG(direction) OVER (PARTITION BY employee_id ORDER BY punched_at) AS previous_direction,
+       LEAD(punched_at) OVER (PARTITION BY employee_id ORDER BY punched_at) AS next_at,
+       LEAD(direction) OVER (PARTITION BY employee_id ORDER BY punched_at) AS next_direction
+FROM directed
+"""
+
+OUTSIDE_WINDOW = {
+    'postgresql': "punched_at - previous_at > :window * INTERVAL '1 second'",
+    'sqlite': "(julianday(punched_at) - julianday(previous_at)) * 86400 > :window",
+}
+
+# An employee's open shift is closed by the first punch of the import when
+# that punch is an out
+CLOSE_OPEN_SHIFTS = """
+UPDATE {attendance} SET
+    clock_out = (SELECT punch.punched_at FROM attendance_import_punches AS punch
+                 WHERE punch.employee_id = attendance.employee_id
+                 AND punch.n = 1 AND punch.direction = 'out'),
+    updated_at = :now
+WHERE clock_out IS NULL AND EXISTS (
+    SELECT 1 FROM attendance_import_punches AS punch
+    WHERE punch.employee_id = attendance.employee_id
+    AND punch.n = 1 AND punch.direction = 'out'
+    AND punch.punched_at > attendance.clock_in
+)
+RETURNING clock_in
+"""
+
+# Every in opens a shift that the out right after it closes, shifts already
+# imported and second open shifts are skipped
+INSERT_SHIFTS = """
+INSERT INTO {attendance} (employee_id, clock_in, clock_out, created_at, updated_at)
+SELECT punch.employee_id, punch.punched_at,
+       CASE WHEN punch.next_direction = 'out' THEN punch.next_at END, :now, :now
+FROM attendance_import_punches AS punch
+WHERE punch.direction = 'in'
+AND (punch.next_direction = 'out' OR punch.next_at IS NULL)
+AND NOT EXISTS (
+    SELECT 1 FROM {attendance} AS existing
+    WHERE existing.employee_id = punch.employee_id
+    AND existing.clock_in = punch.punched_at
+)
+ON CONFLICT DO NOTHING
+"""
+
+COUNT_PUNCHES = """
+SELECT COUNT(*),
+       SUM(CASE WHEN (direction = 'in' AND next_direction = 'in')
+                  OR (direction = 'out' AND n > 1 AND previous_direction = 'out')
+           THEN 1 ELSE 0 END)
+FROM attendance_import_punches
+"""
+
+
+INVALID_PUNCH_LOG = 'The punch log must be a UTF-8 CSV file'
+
+
+class InvalidPunchLog(ValueError):
+    """raised when an uploaded punch log is not a CSV with the expected columns"""
+
+
+def read_punch_log(stream):
+    """Rows of a binary CSV stream, read lazily as dicts keyed by column"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    try:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    except (UnicodeDecodeError, csv.Error):
+        raise InvalidPunchLog(INVALID_PUNCH_LOG)
+    missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+    if missing:
+        raise InvalidPunchLog(f"The punch log has no {', '.join(missing)} column")
+    return _read_rows(reader)
+
+
+def _read_rows(reader):
+    # the rows are decoded as they are read, past the header
+    try:
+        yield from reader
+    except (UnicodeDecodeError, csv.Error):
+        raise InvalidPunchLog(INVALID_PUNCH_LOG)
+
+
+def parse_punch(row):
+    """Validate and normalize one CSV row
+
+    timestamps are ISO 8601, those with an offset are converted to UTC and
+    those without one are taken as UTC
+
+    returns:
+        tuple: (employee_id, punched_at, direction)
+    """
+    try:
+        employee_id = int(row.get('employee_id') or '')
+    except ValueError:
+        raise ValueError('employee_id must be an integer')
+
+    try:
+        punched_at = datetime.fromisoformat((row.get('timestamp') or '').strip())
+    except ValueError:
+        raise ValueError('timestamp must be an ISO 8601 date and time')
+    if punched_at.tzinfo is not None:
+        punched_at = punched_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    direction = (row.get('direction') or '').strip().lower()
+    if direction not in DIRECTIONS:
+        raise ValueError('direction must be in or out')
+    return employee_id, punched_at, DIRECTIONS[direction]
+
+
+def _stage_chunk(connection, chunk):
+    if connection.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(chunk)
+        buffer.seek(0)
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert('COPY attendance_import FROM STDIN WITH (FORMAT csv)', buffer)
+        finally:
+            cursor.close()
+    else:
+        connection.execute(
+            text('INSERT INTO attendance_import (employee_id, punched_at, direction) '
+                 'VALUES (:employee_id, :punched_at, :direction)'),
+            [{'employee_id': employee_id,
+              'punched_at': punched_at.isoformat(sep=' ', timespec='microseconds'),
+              'direction': direction}
+             for employee_id, punched_at, direction in chunk]
+        )
+
+
+def import_punches(rows, progress=None):
+    """Import punch rows into the attendance of the tenant bound to the session
+
+    args:
+        rows: iterable of dicts with employee_id, timestamp and direction
+        progress: called with the report after each chunk
+
+    returns:
+        dict: counts of the import and the first rejected rows
+    """
+    config = current_app.config
+    report = {'rows': 0, 'staged': 0, 'duplicates': 0, 'unmatched': 0,
+              'shifts_created': 0, 'shifts_closed': 0,
+              'rejected': 0, 'rejected_rows': []}
+    first_day = last_day = None
+    employee_ids = set()
+
+    connection = db.session.connection()
+    connection.execute(text(STAGING_TABLE))
+
+    chunk = []
+    for line, row in enumerate(rows, start=2):
+        report['rows'] += 1
+        try:
+            punch = parse_punch(row)
+        except ValueError as e:
+            report['rejected'] += 1
+            if len(report['rejected_rows']) < config['IMPORT_MAX_REJECTED_ROWS']:
+                report['rejected_rows'].append({'line': line, 'error': str(e)})
+            continue
+
+        chunk.append(punch)
+        employee_ids.add(punch[0])
+        day = punch[1].date()
+        first_day = day if first_day is None else min(first_day, day)
+        last_day = day if last_day is None else max(last_day, day)
+
+        if len(chunk) >= config['IMPORT_CHUNK_SIZE']:
+            _stage_chunk(connection, chunk)
+            report['staged'] += len(chunk)
+            chunk = []
+            if progress:
+                progress(report)
+
+    if chunk:
+        _stage_chunk(connection, chunk)
+        report['staged'] += len(chunk)
+    if progress:
+        progress(report)
+
+    if report['staged']:
+        attendance = f'{quote_schema(current_tenant_schema())}.attendance'
+        now = datetime.now(timezone.utc)
+
+        connection.execute(
+            text(PUNCHES_TABLE.format(outside_window=OUTSIDE_WINDOW[connection.dialect.name])),
+            {'window': config['IMPORT_DEDUPE_SECONDS']}
+        )
+        punches, unmatched = connection.execute(text(COUNT_PUNCHES)).one()
+        report['duplicates'] = report['staged'] - punches
+        report['unmatched'] = unmatched or 0
+
+        closed = connection.execute(
+            text(CLOSE_OPEN_SHIFTS.format(attendance=attendance)).columns(clock_in=DateTime),
+            {'now': now}
+        ).scalars().all()
+        report['shifts_closed'] = len(closed)
+        if closed:
+            first_day = min(first_day, min(closed).date())
+
+        report['shifts_created'] = connection.execute(
+            text(INSERT_SHIFTS.format(attendance=attendance)), {'now': now}
+        ).rowcount
+
+        connection.execute(text('DROP TABLE attendance_import_punches'))
+
+    connection.execute(text('DROP TABLE attendance_import'))
+    db.session.commit()
+
+    if report['shifts_created'] or report['shifts_closed']:
+        # shifts closed past midnight reach into the following day, shifts
+        # are only created or closed for employees with punches in the import
+        rebuild_rollups(first_day, last_day + timedelta(days=1), employee_ids)
+    return report
@@ -0,0 +1,148 @@
+"""Daily attendance rollups
+
+closed shifts are added to daily_attendance_summary as they close, so
+timesheets read one row per employee and day instead of every punch.
+Days are UTC days, a shift running past midnight is split between them.
+"""
+from datetime import datetime, time, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import case, delete, insert, select
+
+from tunga_hr_app import db
+
+from ..models.tenant import Attendance, DailyAttendanceSummary
+from ..utils.database import dialect_insert
+
+# employee ids bound per statement by rebuild_rollups, each id is a bound
+# parameter and SQLite builds before 3.32 accept no more than 999
+EMPLOYEE_BATCH_SIZE = 500
+
+
+def split_shift(clock_in, clock_out):
+    """split a shift at midnight
+
+    returns:
+        list: (work_date, seconds, start, end) of each day of the shift
+    """
+    segments = []
+    start = clock_in
+    while start < clock_out:
+        end = min(datetime.combine(start.date() + timedelta(days=1), time(), start.tzinfo),
+                  clock_out)
+        segments.append((start.date(), int((end - start).total_seconds()), start, end))
+        start = end
+    return segments
+
+
+def summarize(shifts, start_date=None, end_date=None):
+    """Sum closed shifts into daily summary rows
+
+    args:
+        shifts: rows with employee_id, clock_in and clock_out
+        start_date, end_date: only keep the days in this range
+
+    returns:
+        dict: summary row of each (employee_id, work_date)
+    """
+    now = datetime.now(timezone.utc)
+    rows = {}
+    for shift in shifts:
+        for work_date, seconds, start, end in split_shift(shift.clock_in, shift.clock_out):
+            if (start_date and work_date < start_date) or (end_date and work_date > end_date):
+                continue
+
+            row = rows.get((shift.employee_id, work_date))
+            if row is None:
+                rows[(shift.employee_id, work_date)] = {
+                    'employee_id': shift.employee_id,
+                    'work_date': work_date,
+                    'worked_seconds': seconds,
+                    'shifts': 1,
+                    'first_clock_in': start,
+                    'last_clock_out': end,
+                    'updated_at': now,
+                }
+            else:
+                row['worked_seconds'] += seconds
+                row['shifts'] += 1
+                row['first_clock_in'] = min(row['first_clock_in'], start)
+                row['last_clock_out'] = max(row['last_clock_out'], end)
+    return rows
+
+
+def rollup_statement(shifts, bind=None):
+    """upsert adding closed shifts to their daily summaries, None if there
+    is nothing to add"""
+    rows = summarize(shifts)
+    if not rows:
+        return None
+
+    summary = DailyAttendanceSummary
+    statement = dialect_insert(summary, bind).values(list(rows.values()))
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[summary.employee_id, summary.work_date],
+        set_={
+            'worked_seconds': summary.worked_seconds + excluded.worked_seconds,
+            'shifts': summary.shifts + excluded.shifts,
+            'first_clock_in': case(
+                (summary.first_clock_in <= excluded.first_clock_in, summary.first_clock_in),
+                else_=excluded.first_clock_in
+            ),
+            'last_clock_out': case(
+                (summary.last_clock_out >= excluded.last_clock_out, summary.last_clock_out),
+                else_=excluded.last_clock_out
+            ),
+            'updated_at': excluded.updated_at,
+        }
+    )
+
+
+def rebuild_rollups(start_date, end_date, employee_ids=None):
+    """Recompute the daily summaries of a date range from the shifts
+
+    runs in the tenant schema bound to the session, shifts still open are
+    left out until they close. `employee_ids` limits the rebuild to those
+    employees, EMPLOYEE_BATCH_SIZE at a time
+
+    returns:
+        int: number of daily summaries written
+    """
+    range_start = datetime.combine(start_date, time())
+    range_end = datetime.combine(end_date + timedelta(days=1), time())
+
+    stale = delete(DailyAttendanceSummary).where(
+        DailyAttendanceSummary.work_date.between(start_date, end_date)
+    )
+    shifts = select(Attendance.employee_id, Attendance.clock_in, Attendance.clock_out).where(
+        Attendance.clock_out.is_not(None),
+        Attendance.clock_in < range_end,
+        Attendance.clock_out > range_start
+    )
+
+    batches = [None]
+    if employee_ids:
+        employee_ids = sorted(employee_ids)
+        batches = [employee_ids[i:i + EMPLOYEE_BATCH_SIZE]
+                   for i in range(0, len(employee_ids), EMPLOYEE_BATCH_SIZE)]
+
+    written = 0
+    for batch in batches:
+        batch_stale, batch_shifts = stale, shifts
+        if batch is not None:
+            batch_stale = stale.where(DailyAttendanceSummary.employee_id.in_(batch))
+            batch_shifts = shifts.where(Attendance.employee_id.in_(batch))
+
+        db.session.execute(batch_stale)
+        rows = summarize(
+            db.session.execute(batch_shifts.execution_options(
+                yield_per=current_app.config['EXPORT_BATCH_SIZE']
+            )),
+            start_date, end_date
+        )
+        if rows:
+            db.session.execute(insert(DailyAttendanceSummary), list(rows.values()))
+        written += len(rows)
+    db.session.commit()
+    return written
@@ -0,0 +1,159 @@
+from . import attendance
+
+from flask_jwt_extended import get_jwt_identity, jwt_required
+
+from flask import current_app, request, jsonify, make_response, g
+
+from sqlalchemy import func, select
+
+from tunga_hr_app import db
+
+from .importer import InvalidPunchLog, import_punches, read_punch_log
+from .writer import AttendanceWriterBusy, record_punch
+from ..models.tenant import DailyAttendanceSummary
+from ..utils.middleware import change_tenant_schema, is_admin
+from ..utils.pagination import read_date_range
+from ..utils.routing import read_only
+
+
+@attendance.before_request
+def before_request():
+    if request.method == 'OPTIONS':
+        response = make_response()
+        response.headers['Access-Control-Allow-Origin'] = request.headers.get('Origin', '*')
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get(
+            'Access-Control-Request-Headers', 'Authorization, Content-Type'
+        )
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.status_code = 200
+        return response
+    return change_tenant_schema()
+
+
+@attendance.app_errorhandler(AttendanceWriterBusy)
+def attendance_writer_busy(e):
+    return jsonify({'error': 'Attendance is busy, please try again'}), 503
+
+
+@attendance.route('/clock-in', methods=['POST'])
+@jwt_required()
+def clock_in():
+    shift = record_punch('clock_in', g.tenant_schema, int(get_jwt_identity()))
+
+    if shift is None:
+        return jsonify({'error': 'You are already clocked in'}), 409
+
+    return jsonify(shift), 201
+
+
+@attendance.route('/clock-out', methods=['POST'])
+@jwt_required()
+def clock_out():
+    shift = record_punch('clock_out', g.tenant_schema, int(get_jwt_identity()))
+
+    if shift is None:
+        return jsonify({'error': 'You are not clocked in'}), 409
+
+    return jsonify(shift), 200
+
+
+@attendance.route('/timesheet', methods=['GET'])
+@jwt_required()
+@read_only
+def timesheet():
+    employee_id = request.args.get('employee_id', get_jwt_identity())
+
+    if str(employee_id) != str(get_jwt_identity()) and not is_admin():
+        return jsonify({'message': 'You do not have permission to view this information'}), 403
+
+    try:
+        employee_id = int(employee_id)
+        start, end = read_date_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    days = db.session.scalars(
+        select(DailyAttendanceSummary)
+        .where(DailyAttendanceSummary.employee_id == employee_id,
+               DailyAttendanceSummary.work_date.between(start, end))
+        .order_by(DailyAttendanceSummary.work_date)
+    ).all()
+
+    return jsonify({
+        'employee_id': employee_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'worked_seconds': sum(day.worked_seconds for day in days),
+        'days': [{
+            'work_date': day.work_date.isoformat(),
+            'worked_seconds': day.worked_seconds,
+            'shifts': day.shifts,
+            'first_clock_in': day.first_clock_in,
+            'last_clock_out': day.last_clock_out
+        } for day in days]
+    }), 200
+
+
+@attendance.route('/timesheets', methods=['GET'])
+@jwt_required()
+@read_only
+def timesheets():
+    if not is_admin():
+        return jsonify({'message': 'You do not have permission to view this information'}), 403
+
+    try:
+        start, end = read_date_range()
+        employee_ids = [int(employee_id) for employee_id in 
+                        request.args['employee_ids'].split(',')] \
+            if request.args.get('employee_ids') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = (select(DailyAttendanceSummary.employee_id,
+                    func.sum(DailyAttendanceSummary.worked_seconds).label('worked_seconds'),
+                    func.sum(DailyAttendanceSummary.shifts).label('shifts'),
+                    func.count().label('days_worked'))
+             .where(DailyAttendanceSummary.work_date.between(start, end))
+             .group_by(DailyAttendanceSummary.employee_id)
+             .order_by(DailyAttendanceSummary.employee_id))
+    if employee_ids:
+        query = query.where(DailyAttendanceSummary.employee_id.in_(employee_ids))
+
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'employees': [{
+            'employee_id': row.employee_id,
+            'worked_seconds': row.worked_seconds,
+            'shifts': row.shifts,
+            'days_worked': row.days_worked
+        } for row in db.session.execute(query)]
+    }), 200
+
+
+@attendance.route('/import', methods=['POST'])
+@jwt_required()
+def import_punch_log():
+    if not is_admin():
+        return jsonify({'message': 'You do not have permission to import attendance'}), 403
+
+    # multipart uploads are spooled to disk by werkzeug, a text/csv body is
+    # read straight from the socket
+    if 'file' in request.files:
+        stream = request.files['file'].stream
+    elif request.mimetype == 'text/csv':
+        stream = request.stream
+    else:
+        return jsonify({'error': 'Upload the punch log as a file or a text/csv body'}), 400
+
+    def progress(report):
+        current_app.logger.info('Attendance import for %s: %d rows read, %d rejected',
+                                g.tenant_schema, report['rows'], report['rejected'])
+
+    try:
+        report = import_punches(read_punch_log(stream), progress)
+    except InvalidPunchLog as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(report), 200
@@ -0,0 +1,215 @@
+"""Attendance writes
+
+clock-ins insert against the open shift index and clock-outs close the
+open shift with one UPDATE, so neither reads before it writes. With
+ATTENDANCE_BATCH_WRITES the clock events of concurrent requests are grouped
+per tenant into multi-row statements by a background writer. Closed
+shifts are added to the daily rollups in the same transaction.
+"""
+import atexit
+import weakref
+from concurrent.futures import Future, TimeoutError
+from datetime import datetime, timezone
+from os import getpid
+from queue import Queue, Empty
+from threading import Thread, Lock
+from time import monotonic
+
+from flask import current_app
+from sqlalchemy import case, update
+
+from tunga_hr_app import db
+
+from ..models.tenant import Attendance
+from ..utils.database import dialect_insert, get_tenant_registry
+from .rollups import rollup_statement
+
+_STOP = object()
+_writer_lock = Lock()
+
+
+class AttendanceWriterBusy(Exception):
+    """raised when a batched clock event is not written in time"""
+
+
+def clock_in_statement(punches, bind=None):
+    """INSERT opening a shift for each (employee_id, clock_in)
+
+    employees that already have an open shift conflict on the open shift
+    index and are left out of the returned rows
+    """
+    now = datetime.now(timezone.utc)
+    return (
+        dialect_insert(Attendance, bind)
+        .values([{'employee_id': employee_id, 'clock_in': clock_in,
+                  'created_at': now, 'updated_at': now}
+                 for employee_id, clock_in in punches])
+        .on_conflict_do_nothing()
+        .returning(Attendance.attendance_id, Attendance.employee_id,
+                   Attendance.clock_in, Attendance.clock_out)
+    )
+
+
+def clock_out_statement(punches, bind=None):
+    """UPDATE closing the open shift of each (employee_id, clock_out)
+
+    employees without an open shift are left out of the returned rows
+    """
+    clock_outs = dict(punches)
+    return (
+        update(Attendance)
+        .where(Attendance.employee_id.in_(clock_outs), Attendance.clock_out.is_(None))
+        .values(clock_out=case(clock_outs, value=Attendance.employee_id),
+                updated_at=datetime.now(timezone.utc))
+        .returning(Attendance.attendance_id, Attendance.employee_id,
+                   Attendance.clock_in, Attendance.clock_out)
+        .execution_options(synchronize_session=False)
+    )
+
+
+STATEMENTS = {
+    'clock_in': clock_in_statement,
+    'clock_out': clock_out_statement,
+}
+
+
+def shift_to_dict(shift):
+    return {
+        'attendance_id': shift.attendance_id,
+        'employee_id': shift.employee_id,
+        'clock_in': shift.clock_in,
+        'clock_out': shift.clock_out,
+    }
+
+
+class AttendanceWriter:
+    """Background writer batching clock events per tenant and kind
+
+    Events are collected for up to ATTENDANCE_BATCH_WAIT seconds or
+    ATTENDANCE_BATCH_SIZE events and written with one statement per tenant
+    and kind, the requests waiting on the outcome of their own event.
+    """
+
+    instances = weakref.WeakSet()
+
+    def __init__(self, app):
+        self.app = app
+        self.pid = getpid()
+        self.queue = Queue()
+        self._lock = Lock()
+        self._metrics = dict(events=0, batches=0, failed=0)
+        self._worker = Thread(target=self._work, daemon=True, name='attendance-writer')
+        self._worker.start()
+        AttendanceWriter.instances.add(self)
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics, pending=self.queue.qsize())
+
+    def submit(self, kind, schema, employee_id, at):
+        """queue a clock event and wait for its shift
+
+        returns:
+            dict: the shift opened or closed, None on a double punch
+        """
+        future = Future()
+        self.queue.put((kind, schema, employee_id, at, future))
+        try:
+            return future.result(timeout=self.app.config['ATTENDANCE_WRITE_TIMEOUT'])
+        except TimeoutError:
+            raise AttendanceWriterBusy()
+
+    def _collect(self, event):
+        events = [event]
+        deadline = monotonic() + self.app.config['ATTENDANCE_BATCH_WAIT']
+        while len(events) < self.app.config['ATTENDANCE_BATCH_SIZE']:
+            try:
+                event = self.queue.get(timeout=max(deadline - monotonic(), 0))
+            except Empty:
+                break
+            if event is _STOP:
+                self.queue.put(_STOP)
+                break
+            events.append(event)
+        return events
+
+    def _work(self):
+        with self.app.app_context():
+            while True:
+                event = self.queue.get()
+                if event is _STOP:
+                    return
+                self._write(self._collect(event))
+
+    def _write(self, events):
+        batches = {}
+        for kind, schema, employee_id, at, future in events:
+            batch = batches.setdefault((kind, schema), {})
+            if employee_id in batch:
+                # a second punch in the same batch is a double punch
+                future.set_result(None)
+            else:
+                batch[employee_id] = (at, future)
+
+        for (kind, schema), batch in batches.items():
+            try:
+                engine = get_tenant_registry().get(schema)[0]
+                with engine.begin() as connection:
+                    punches = [(employee_id, at) for employee_id, (at, _) in batch.items()]
+                    shifts = connection.execute(STATEMENTS[kind](punches, connection)).all()
+                    rollup = rollup_statement(shifts, connection) if kind == 'clock_out' else None
+                    if rollup is not None:
+                        connection.execute(rollup)
+            except Exception as e:
+                self.app.logger.exception(f'Writing {kind} events of tenant {schema} failed')
+                with self._lock:
+                    self._metrics['failed'] += len(batch)
+                for _, future in batch.values():
+                    future.set_exception(e)
+                continue
+
+            shifts = {shift.employee_id: shift_to_dict(shift) for shift in shifts}
+            for employee_id, (_, future) in batch.items():
+                future.set_result(shifts.get(employee_id))
+            with self._lock:
+                self._metrics['events'] += len(batch)
+                self._metrics['batches'] += 1
+
+    def shutdown(self):
+        """write the queued events and stop the writer"""
+        self.queue.put(_STOP)
+        self._worker.join()
+
+
+def get_attendance_writer():
+    app = current_app._get_current_object()
+    with _writer_lock:
+        writer = app.extensions.get('attendance_writer')
+        if writer is None or writer.pid != getpid():
+            writer = app.extensions['attendance_writer'] = AttendanceWriter(app)
+        return writer
+
+
+@atexit.register
+def _shutdown_attendance_writers():
+    for writer in list(AttendanceWriter.instances):
+        if writer.pid == getpid():
+            writer.shutdown()
+
+
+def record_punch(kind, schema, employee_id):
+    """Open ('clock_in') or close ('clock_out') the shift of an employee
+
+    returns:
+        dict: the shift, None when the employee is already clocked in or
+        is not clocked in
+    """
+    at = datetime.now(timezone.utc)
+    if current_app.config['ATTENDANCE_BATCH_WRITES']:
+        return get_attendance_writer().submit(kind, schema, employee_id, at)
+
+    shift = db.session.execute(STATEMENTS[kind]([(employee_id, at)])).first()
+    if kind == 'clock_out' and shift is not None:
+        db.session.execute(rollup_statement([shift]))
+    db.session.commit()
+    return shift_to_dict(shift) if shift is not None else None
@@ -12,17 +12,17 @@ from flask import request, jsonify
 
 from tunga_hr_app import db
 
-from .email import send_account_validation_email
-
 from ..models import (
     User, 
     Organization,
-    UserOrganization
+    UserOrganization,
+    ProvisioningJob
 )
 
 from marshmallow import ValidationError
 from sqlalchemy.exc import IntegrityError
-from ..utils.database import Database
+from ..utils.provisioning import start_provisioning
+from ..utils.security import HashingPoolBusy, needs_rehash
 
 
 @auth.route('/register', methods=['POST'])
@@ -49,12 +49,9 @@ def register():
             db.session.add(account)
             db.session.commit()
 
-            # Create new schema for Organization Tenant
-            Database(organization.organization_id).create_tenant_schema()
-
-            # Send account validation email 
-            # Uncomment once emails are activated
-            #send_account_validation_email(user=user)
+            # Create the Organization Tenant schema and send the account
+            # validation email in the background
+            job = start_provisioning(organization, user)
 
         except IntegrityError as e:
             db.session.rollback()
@@ -65,8 +62,25 @@ def register():
         
         return jsonify({
             "status": "success",
-            "message": "Account has been successfully created. A confirmation link has been sent to your email"
-        }), 200
+            "message": "Account has been successfully created. A confirmation link has been sent to your email",
+            "provisioning_id": job.job_id,
+            "provisioning_token": job.get_status_token()
+        }), 202
+
+
+@auth.route('/provisioning/<job_id>', methods=['GET'])
+def provisioning_status(job_id):
+    job = db.session.get(ProvisioningJob, job_id)
+
+    if not job:
+        return jsonify({'error': 'Provisioning job not found'}), 404
+
+    # the job is polled before the user can log in, so it is authorized by
+    # the token returned on registration
+    if not job.verify_status_token(request.headers.get('X-Provisioning-Token', '')):
+        return jsonify({'error': 'Invalid provisioning token'}), 403
+
+    return jsonify(job.to_dict()), 200
 
 
 @auth.route('/login', methods=['POST'])
@@ -79,6 +93,11 @@ def login():
             return jsonify({
                     "message": "The email or password provided is incorrect."}), 401
 
+        # Upgrade hashes made with outdated parameters
+        if needs_rehash(user.password_hash):
+            user.set_password(request_data['password'])
+            db.session.commit()
+
         user_organization = UserOrganization.query.filter_by(
             user_id=user.user_id
             ).first_or_404()
@@ -107,6 +126,11 @@ def login():
         return jsonify(err.messages), 400
 
 
+@auth.app_errorhandler(HashingPoolBusy)
+def hashing_pool_busy(e):
+    return jsonify({'error': 'Too many requests, please try again.'}), 503, {'Retry-After': '1'}
+
+
 @auth.route('/logout', methods=['POST'])
 def logout():
     pass
\ No newline at end of file
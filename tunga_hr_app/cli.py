@@ -0,0 +1,95 @@
+import time
+
+import click
+from sqlalchemy import select
+
+from tunga_hr_app import db
+
+from .attendance.importer import InvalidPunchLog, import_punches, read_punch_log
+from .attendance.rollups import rebuild_rollups
+from .email import drain_outbox
+from .models.public import Organization, ProvisioningJob
+from .utils.database import Database
+from .utils.provisioning import fill_spare_pool, provision_tenant, retryable_provisioning_jobs
+
+
+def register(app):
+
+    @app.cli.group()
+    def tenants():
+        """Tenant schema commands."""
+        pass
+
+    @tenants.command('fill-pool')
+    @click.option('--size', type=int, help='Number of spare schemas to keep.')
+    def fill_pool(size):
+        """Create spare tenant schemas until the pool is full."""
+        created = fill_spare_pool(size)
+        click.echo(f'Created {created} spare schemas')
+
+    @tenants.command('retry-provisioning')
+    def retry_provisioning():
+        """Run provisioning jobs that failed or whose run was abandoned."""
+        for job_id in retryable_provisioning_jobs():
+            provision_tenant(job_id)
+            click.echo(f'{job_id}: {db.session.get(ProvisioningJob, job_id).status}')
+
+    @app.cli.group()
+    def outbox():
+        """Email outbox commands."""
+        pass
+
+    @outbox.command()
+    @click.option('--once', is_flag=True, help='Exit when no email is due.')
+    def drain(once):
+        """Send the emails queued in the outbox."""
+        while True:
+            sent = drain_outbox()
+            if sent:
+                click.echo(f'Sent {sent} emails')
+            if once:
+                break
+            db.session.remove()
+            time.sleep(app.config['OUTBOX_POLL_INTERVAL'])
+
+    @app.cli.group()
+    def attendance():
+        """Attendance commands."""
+        pass
+
+    @attendance.command('rebuild-rollups')
+    @click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), required=True)
+    @click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), required=True)
+    @click.option('--tenant', 'tenants', multiple=True,
+                  help='Tenant to rebuild, all tenants by default.')
+    def rebuild_rollups_command(start, end, tenants):
+        """Recompute the daily attendance summaries from the shifts."""
+        tenants = tenants or [str(organization_id) for organization_id in
+                              db.session.scalars(select(Organization.organization_id))]
+        for tenant in tenants:
+            Database(tenant).switch_schema()
+            written = rebuild_rollups(start.date(), end.date())
+            click.echo(f'Tenant {tenant}: {written} daily summaries')
+
+    @attendance.command('import')
+    @click.argument('punch_log', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--tenant', required=True, help='Tenant the punches belong to.')
+    def import_command(punch_log, tenant):
+        """Import the shifts of an attendance device punch log (CSV)."""
+        Database(tenant).switch_schema()
+
+        def progress(report):
+            click.echo(f"{report['rows']} rows read, {report['staged']} staged, "
+                       f"{report['rejected']} rejected")
+
+        with open(punch_log, 'rb') as stream:
+            try:
+                report = import_punches(read_punch_log(stream), progress)
+            except InvalidPunchLog as e:
+                raise click.ClickException(str(e))
+
+        for rejected in report['rejected_rows']:
+            click.echo(f"line {rejected['line']}: {rejected['error']}", err=True)
+        click.echo(f"Tenant {tenant}: {report['shifts_created']} shifts created, "
+                   f"{report['shifts_closed']} closed, {report['duplicates']} duplicate "
+                   f"and {report['unmatched']} unmatched punches")
@@ -1,28 +1,248 @@
-from threading import Thread
+import atexit
+import weakref
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from os import getpid
+from queue import Queue, Empty, Full
+from threading import Thread, Lock
 from flask import current_app
 # import requests
 from flask_mail import Message
-from tunga_hr_app import mail
+from sqlalchemy import or_, select
+from tunga_hr_app import db, mail
+from tunga_hr_app.models.public import EmailOutbox
 
+_STOP = object()
+_dispatcher_lock = Lock()
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
 
+class MailQueueFull(Exception):
+    """set on a message that waited MAIL_QUEUE_TIMEOUT seconds for the full mail queue"""
 
-def send_email(subject, sender, recipients, html_body, text_body=None,
-               attachments=None, sync=False):
+
+class MailDispatcher:
+    """Fixed pool of mail workers sending queued messages
+
+    Each worker keeps its SMTP connection open while messages keep coming,
+    sending up to MAIL_MAX_PER_CONNECTION messages before reconnecting, and
+    closes it after MAIL_IDLE_TIMEOUT seconds without messages.
+    """
+
+    instances = weakref.WeakSet()
+
+    def __init__(self, app):
+        self.app = app
+        self.pid = getpid()
+        self.queue = Queue(maxsize=app.config['MAIL_QUEUE_SIZE'])
+        self._lock = Lock()
+        self._metrics = dict(queued=0, sent=0, failed=0, rejected=0, connections=0)
+        self._workers = [Thread(target=self._work, daemon=True, name=f'mail-{i}')
+                         for i in range(app.config['MAIL_WORKERS'])]
+        for worker in self._workers:
+            worker.start()
+        MailDispatcher.instances.add(self)
+
+    def _count(self, metric, value=1):
+        with self._lock:
+            self._metrics[metric] += value
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics, pending=self.queue.qsize())
+
+    def submit(self, msg):
+        """Queue a message
+
+        returns:
+            Future: resolved once the message is sent, or with the error
+            that kept it from being sent
+        """
+        future = Future()
+        try:
+            self.queue.put((msg, future), timeout=self.app.config['MAIL_QUEUE_TIMEOUT'])
+        except Full:
+            self._count('rejected')
+            future.set_exception(MailQueueFull())
+            return future
+        self._count('queued')
+        return future
+
+    def _work(self):
+        with self.app.app_context():
+            item = self.queue.get()
+            while item is not _STOP:
+                item = self._send_session(item)
+                if item is None:
+                    item = self.queue.get()
+
+    def _send_session(self, item):
+        """send messages on one connection
+
+        returns:
+            the item taken from the queue but not sent, None once the queue
+            went idle
+        """
+        leftover = item
+        try:
+            with mail.connect() as connection:
+                self._count('connections')
+                leftover = self._send_on(connection, item)
+        except Exception as e:
+            # errors closing the connection keep the leftover, which may be
+            # _STOP, other errors end the session with the first message
+            if leftover is item:
+                if not item[1].done():
+                    self._count('failed')
+                    item[1].set_exception(e)
+                leftover = None
+            self.app.logger.exception('Sending email failed')
+        return leftover
+
+    def _send_on(self, connection, item):
+        for _ in range(self.app.config['MAIL_MAX_PER_CONNECTION']):
+            msg, future = item
+            try:
+                connection.send(msg)
+            except Exception as e:
+                self._count('failed')
+                future.set_exception(e)
+                self.app.logger.exception(f'Sending email to {msg.recipients} failed')
+                # the session may be broken, the next message reconnects
+                return self._next()
+            self._count('sent')
+            future.set_result(None)
+
+            item = self._next()
+            if item is None or item is _STOP:
+                return item
+        return item
+
+    def _next(self):
+        try:
+            return self.queue.get(timeout=self.app.config['MAIL_IDLE_TIMEOUT'])
+        except Empty:
+            return None
+
+    def shutdown(self):
+        """send the queued messages and stop the workers"""
+        for _ in self._workers:
+            self.queue.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+
+
+def get_mail_dispatcher():
+    app = current_app._get_current_object()
+    with _dispatcher_lock:
+        dispatcher = app.extensions.get('mail_dispatcher')
+        if dispatcher is None or dispatcher.pid != getpid():
+            dispatcher = app.extensions['mail_dispatcher'] = MailDispatcher(app)
+        return dispatcher
+
+
+def mail_metrics():
+    """metrics of the mail workers of this process, None when none started"""
+    dispatcher = current_app.extensions.get('mail_dispatcher')
+    if dispatcher is None or dispatcher.pid != getpid():
+        return None
+    return dispatcher.metrics()
+
+
+@atexit.register
+def _shutdown_mail_dispatchers():
+    for dispatcher in list(MailDispatcher.instances):
+        if dispatcher.pid == getpid():
+            dispatcher.shutdown()
+
+
+def build_message(subject, sender, recipients, html_body, text_body=None):
     msg = Message(subject, sender=('Cherio', sender), recipients=recipients)
     msg.html = html_body
 
     if text_body:
         msg.body = text_body
-    
-    if attachments:
-        for attachment in attachments:
-            msg.attach(*attachment)
-    if sync:
-        mail.send(msg)
-    else:
-        Thread(target=send_async_email,
-               args=(current_app._get_current_object(), msg)).start()
\ No newline at end of file
+    return msg
+
+
+def queue_email(subject, sender, recipients, html_body, text_body=None):
+    """Add an email to the outbox
+
+    the email is part of the current transaction, it is only sent once the
+    caller commits and is lost with it on rollback
+    """
+    email = EmailOutbox(subject=subject, sender=sender,
+                        recipients=','.join(recipients),
+                        html_body=html_body, text_body=text_body)
+    db.session.add(email)
+    return email
+
+
+def claim_outbox_batch(batch_size):
+    """Lease a batch of due outbox emails
+
+    rows are locked with SKIP LOCKED so concurrent drain workers claim
+    different emails, and leased for OUTBOX_LEASE_SECONDS
+    """
+    now = datetime.now(timezone.utc)
+    emails = db.session.scalars(
+        select(EmailOutbox)
+        .where(EmailOutbox.status == 'Pending',
+               EmailOutbox.next_attempt_at <= now,
+               or_(EmailOutbox.locked_until.is_(None), EmailOutbox.locked_until <= now))
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+
+    for email in emails:
+        email.locked_until = now + timedelta(seconds=current_app.config['OUTBOX_LEASE_SECONDS'])
+    db.session.commit()
+    return emails
+
+
+def deliver_outbox_batch(emails):
+    """Send leased emails through the mail workers and record the outcome"""
+    config = current_app.config
+
+    def failed(email, error):
+        email.attempts += 1
+        email.last_error = str(error)[:500]
+        if email.attempts >= config['OUTBOX_MAX_ATTEMPTS']:
+            email.status = 'Failed'
+        else:
+            delay = min(config['OUTBOX_RETRY_BASE'] * 2 ** (email.attempts - 1),
+                        config['OUTBOX_RETRY_MAX'])
+            email.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+
+    dispatcher = get_mail_dispatcher()
+    futures = [dispatcher.submit(build_message(email.subject, email.sender,
+                                               email.recipients.split(','),
+                                               email.html_body, email.text_body))
+               for email in emails]
+
+    for email, future in zip(emails, futures):
+        error = future.exception()
+        if error is None:
+            email.status = 'Sent'
+            email.sent_at = datetime.now(timezone.utc)
+        else:
+            failed(email, error)
+        email.locked_until = None
+
+    db.session.commit()
+    return sum(email.status == 'Sent' for email in emails)
+
+
+def drain_outbox(batch_size=None):
+    """Deliver due outbox emails until none are left
+
+    returns:
+        int: number of emails sent
+    """
+    batch_size = batch_size or current_app.config['OUTBOX_BATCH_SIZE']
+    sent = 0
+    while True:
+        emails = claim_outbox_batch(batch_size)
+        if not emails:
+            return sent
+        sent += deliver_outbox_batch(emails)
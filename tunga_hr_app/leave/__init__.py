@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+leave = Blueprint('leave', __name__)
+
+from . import routes
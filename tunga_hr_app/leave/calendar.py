@@ -0,0 +1,123 @@
+"""Leave calendar
+
+who is away on each day of a month, computed with one sweep over the
+leave intervals of the month and cached per tenant and month until a leave
+request of that month changes
+
+With CACHE_REDIS_URL set the months are cached in the shared backend and a
+change is seen by every worker at once. Without it each worker keeps its
+own copy and only the worker that made the change drops it, so the others
+may serve a month up to LEAVE_CALENDAR_CACHE_TTL seconds old.
+"""
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import select
+
+from tunga_hr_app import db
+
+from ..models.tenant import ACTIVE_LEAVE_STATUSES, LeaveRequest
+from ..utils.cache import get_cache
+from ..utils.database import current_tenant_schema
+
+
+def month_bounds(year, month):
+    """first and last day of a month"""
+    first = date(year, month, 1)
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return first, following - timedelta(days=1)
+
+
+def months_between(start, end):
+    """(year, month) of every month from start to end"""
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = year + month // 12, month % 12 + 1
+
+
+def sweep(intervals, first, last):
+    """Employees away on each day from first to last
+
+    intervals are bucketed by the day they start and the day after they
+    end, and one pass over the days adds and removes them from the set of
+    employees away, so the cost is O(intervals + days) plus the output
+
+    args:
+        intervals: (employee_id, status, start, end) with start and end dates
+
+    returns:
+        list: {'out': [...], 'pending': [...]} of employee ids for each day
+    """
+    days = (last - first).days + 1
+    starting = [[] for _ in range(days)]
+    ending = [[] for _ in range(days + 1)]
+
+    for employee_id, status, start, end in intervals:
+        start, end = max(start, first), min(end, last)
+        if start > end:
+            continue
+        kind = 'pending' if status == 'Pending' else 'out'
+        starting[(start - first).days].append((kind, employee_id))
+        ending[(end - first).days + 1].append((kind, employee_id))
+
+    away = {'out': {}, 'pending': {}}
+    calendar = []
+    for day in range(days):
+        for kind, employee_id in ending[day]:
+            away[kind][employee_id] -= 1
+            if not away[kind][employee_id]:
+                del away[kind][employee_id]
+        for kind, employee_id in starting[day]:
+            away[kind][employee_id] = away[kind].get(employee_id, 0) + 1
+        calendar.append({kind: sorted(employees) for kind, employees in away.items()})
+    return calendar
+
+
+def compute_month(year, month):
+    """load the active leave of a month once and sweep it"""
+    first, last = month_bounds(year, month)
+    intervals = db.session.execute(
+        select(LeaveRequest.employee_id, LeaveRequest.status,
+               LeaveRequest.start_date, LeaveRequest.end_date)
+        .where(LeaveRequest.status.in_(ACTIVE_LEAVE_STATUSES),
+               LeaveRequest.start_date <= datetime.combine(last, time()),
+               LeaveRequest.end_date >= datetime.combine(first, time()))
+    )
+    return sweep(((employee_id, status, start.date(), end.date())
+                  for employee_id, status, start, end in intervals), first, last)
+
+
+def get_month(year, month):
+    """the cached calendar of a month of the current tenant"""
+    cache = get_cache('leave_calendar')
+    key = f'{current_tenant_schema()}:{year}-{month:02}'
+    calendar = cache.get(key)
+    if calendar is None:
+        calendar = compute_month(year, month)
+        cache.set(key, calendar)
+    return calendar
+
+
+def get_calendar(start, end, headcount):
+    """Who is away and how many are available on each day from start to end"""
+    days = []
+    for year, month in months_between(start, end):
+        first, _ = month_bounds(year, month)
+        for offset, away in enumerate(get_month(year, month)):
+            day = first + timedelta(days=offset)
+            if start <= day <= end:
+                days.append({
+                    'date': day.isoformat(),
+                    'out': away['out'],
+                    'pending': away['pending'],
+                    'out_count': len(away['out']),
+                    'available_count': headcount - len(away['out'])
+                })
+    return days
+
+
+def invalidate_calendar(start, end):
+    """drop the cached months of the current tenant from start to end"""
+    cache = get_cache('leave_calendar')
+    for year, month in months_between(start, end):
+        cache.delete(f'{current_tenant_schema()}:{year}-{month:02}')
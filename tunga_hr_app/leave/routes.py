@@ -0,0 +1,170 @@
+from datetime import date
+
+from . import leave
+
+from flask_jwt_extended import get_jwt_identity, jwt_required
+
+from flask import request, jsonify, make_response
+
+from sqlalchemy import func, select
+
+from tunga_hr_app import db
+
+from .service import (
+    LeaveError,
+    submit_leave,
+    approve_leave,
+    reject_leave,
+    cancel_leave,
+    get_balances
+)
+from .calendar import get_calendar
+from ..models.public import UserOrganization, get_user_organization
+from ..models.tenant import LeaveRequest, leave_request_row_to_dict
+from ..utils.middleware import change_tenant_schema, is_admin
+from ..utils.pagination import InvalidPageArgument, get_limit, keyset_page, read_date_range
+from ..utils.routing import read_only
+
+
+@leave.before_request
+def before_request():
+    if request.method == 'OPTIONS':
+        response = make_response()
+        response.headers['Access-Control-Allow-Origin'] = request.headers.get('Origin', '*')
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get(
+            'Access-Control-Request-Headers', 'Authorization, Content-Type'
+        )
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.status_code = 200
+        return response
+    return change_tenant_schema()
+
+
+@leave.errorhandler(LeaveError)
+def leave_error(e):
+    return jsonify({'error': e.message}), e.status_code
+
+
+@leave.route('/requests', methods=['POST'])
+@jwt_required()
+def request_leave():
+    request_data = request.get_json() or {}
+
+    try:
+        start = date.fromisoformat(request_data['start_date'])
+        end = date.fromisoformat(request_data['end_date'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'start_date and end_date must be dates (YYYY-MM-DD)'}), 400
+
+    leave_request = submit_leave(
+        employee_id=int(get_jwt_identity()),
+        leave_type=request_data.get('leave_type'),
+        start=start,
+        end=end,
+        reason=request_data.get('reason')
+    )
+
+    return jsonify(leave_request.to_dict()), 201
+
+
+@leave.route('/requests', methods=['GET'])
+@jwt_required()
+@read_only
+def view_leave_requests():
+    employee_id = request.args.get('employee_id')
+
+    if not is_admin():
+        if employee_id and employee_id != str(get_jwt_identity()):
+            return jsonify({'message': 'You do not have permission to view this information'}), 403
+        employee_id = get_jwt_identity()
+
+    query = select(*[getattr(LeaveRequest, column.key) for column in LeaveRequest.__table__.columns])
+    if request.args.get('status'):
+        query = query.where(LeaveRequest.status == request.args['status'])
+
+    try:
+        if employee_id:
+            query = query.where(LeaveRequest.employee_id == int(employee_id))
+        leave_requests, next_cursor = keyset_page(query, [LeaveRequest.leave_id],
+                                                  request.args.get('cursor'), get_limit(),
+                                                  descending=True)
+    except (InvalidPageArgument, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'leave_requests': [leave_request_row_to_dict(row) for row in leave_requests],
+        'next_cursor': next_cursor
+    }), 200
+
+
+@leave.route('/requests/<int:leave_id>/approve', methods=['POST'])
+@jwt_required()
+def approve_leave_request(leave_id):
+    if not is_admin():
+        return jsonify({'message': 'You do not have permission to approve leave'}), 403
+
+    return jsonify(approve_leave(leave_id, int(get_jwt_identity())).to_dict()), 200
+
+
+@leave.route('/requests/<int:leave_id>/reject', methods=['POST'])
+@jwt_required()
+def reject_leave_request(leave_id):
+    if not is_admin():
+        return jsonify({'message': 'You do not have permission to reject leave'}), 403
+
+    return jsonify(reject_leave(leave_id, int(get_jwt_identity())).to_dict()), 200
+
+
+@leave.route('/requests/<int:leave_id>/cancel', methods=['POST'])
+@jwt_required()
+def cancel_leave_request(leave_id):
+    return jsonify(cancel_leave(leave_id, int(get_jwt_identity())).to_dict()), 200
+
+
+@leave.route('/balances', methods=['GET'])
+@jwt_required()
+@read_only
+def view_leave_balances():
+    employee_id = request.args.get('employee_id', get_jwt_identity())
+
+    if str(employee_id) != str(get_jwt_identity()) and not is_admin():
+        return jsonify({'message': 'You do not have permission to view this information'}), 403
+
+    try:
+        employee_id = int(employee_id)
+        year = int(request.args['year']) if 'year' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'employee_id and year must be integers'}), 400
+
+    return jsonify({
+        'employee_id': employee_id,
+        'balances': get_balances(employee_id, year)
+    }), 200
+
+
+@leave.route('/calendar', methods=['GET'])
+@jwt_required()
+@read_only
+def leave_calendar():
+    try:
+        start, end = read_date_range(whole_month=True)
+    except InvalidPageArgument as e:
+        return jsonify({'error': str(e)}), 400
+
+    organization = get_user_organization(get_jwt_identity())
+    if not organization:
+        return jsonify({'message': 'Organization not found for the current user.'}), 404
+
+    headcount = db.session.scalar(
+        select(func.count())
+        .select_from(UserOrganization)
+        .where(UserOrganization.organization_id == organization['organization_id'])
+    )
+
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'headcount': headcount,
+        'days': get_calendar(start, end, headcount)
+    }), 200
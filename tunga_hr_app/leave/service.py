@@ -0,0 +1,250 @@
+"""Leave requests
+
+submitting, approving, rejecting and cancelling leave. Overlapping active
+leave is found through the range index of leave_request and the balances
+of leave_balance are adjusted by each transition instead of being summed
+from the request history.
+"""
+from datetime import date, datetime, time, timezone
+
+from flask import current_app
+from sqlalchemy import and_, func, select, update
+
+from tunga_hr_app import db
+
+from ..models.tenant import ACTIVE_LEAVE_STATUSES, LeaveBalance, LeaveRequest
+from .calendar import invalidate_calendar
+from ..utils.database import current_tenant_schema, dialect_insert
+
+
+class LeaveError(Exception):
+    """raised when a leave request cannot be submitted or changed"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def leave_days(start, end):
+    """number of weekdays from start to end, both included"""
+    weeks, extra = divmod((end - start).days + 1, 7)
+    return weeks * 5 + sum(1 for day in range(extra) if (start.weekday() + day) % 7 < 5)
+
+
+def days_by_year(start, end):
+    """(year, weekdays) of each calendar year the leave from start to end
+    falls in, years without working days are left out"""
+    years = []
+    for year in range(start.year, end.year + 1):
+        days = leave_days(max(start, date(year, 1, 1)), min(end, date(year, 12, 31)))
+        if days:
+            years.append((year, days))
+    return years
+
+
+def _period(start, end):
+    return datetime.combine(start, time()), datetime.combine(end, time())
+
+
+def lock_employee_leave(employee_id):
+    """serialize the leave changes of an employee until the transaction ends"""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(select(func.pg_advisory_xact_lock(
+            func.hashtext(f'{current_tenant_schema()}:leave:{employee_id}')
+        )))
+
+
+def find_overlap(employee_id, start, end):
+    """return the id of an active leave of the employee overlapping start to
+    end, None if there is none"""
+    start_at, end_at = _period(start, end)
+
+    if db.engine.dialect.name == 'postgresql':
+        overlaps = func.tsrange(LeaveRequest.start_date, LeaveRequest.end_date, '[]') \
+            .op('&&')(func.tsrange(start_at, end_at, '[]'))
+    else:
+        overlaps = and_(LeaveRequest.start_date <= end_at, LeaveRequest.end_date >= start_at)
+
+    return db.session.scalar(
+        select(LeaveRequest.leave_id)
+        .where(LeaveRequest.employee_id == employee_id,
+               LeaveRequest.status.in_(ACTIVE_LEAVE_STATUSES),
+               overlaps)
+        .limit(1)
+    )
+
+
+def _ensure_balance(employee_id, leave_type, year):
+    db.session.execute(
+        dialect_insert(LeaveBalance)
+        .values(employee_id=employee_id, leave_type=leave_type, year=year,
+                entitled_days=current_app.config['LEAVE_ENTITLEMENTS'][leave_type],
+                pending_days=0, used_days=0, updated_at=datetime.now(timezone.utc))
+        .on_conflict_do_nothing()
+    )
+
+
+def _adjust_balance(employee_id, leave_type, year, pending=0, used=0, check=False):
+    """add to the pending and used days of a balance
+
+    with `check` the balance is only changed if enough days remain
+
+    returns:
+        bool: False when the balance has too few days left
+    """
+    statement = (
+        update(LeaveBalance)
+        .where(LeaveBalance.employee_id == employee_id,
+               LeaveBalance.leave_type == leave_type,
+               LeaveBalance.year == year)
+        .values(pending_days=LeaveBalance.pending_days + pending,
+                used_days=LeaveBalance.used_days + used,
+                updated_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    if check:
+        statement = statement.where(
+            LeaveBalance.entitled_days.is_(None) |
+            (LeaveBalance.entitled_days - LeaveBalance.used_days - LeaveBalance.pending_days
+             >= pending + used)
+        )
+    return db.session.execute(statement).rowcount > 0
+
+
+def _adjust_balances(employee_id, leave_type, start, end, pending=0, used=0, check=False):
+    """add `pending` and `used` times the days of the leave in each year to
+    the balance of that year
+
+    returns:
+        bool: False when the balance of one of the years has too few days left
+    """
+    return all(_adjust_balance(employee_id, leave_type, year,
+                               pending=pending * days, used=used * days, check=check)
+               for year, days in days_by_year(start, end))
+
+
+def submit_leave(employee_id, leave_type, start, end, reason=None):
+    """Submit a pending leave request
+
+    returns:
+        LeaveRequest: the new request
+    """
+    if leave_type not in current_app.config['LEAVE_ENTITLEMENTS']:
+        raise LeaveError(f"leave_type must be one of {', '.join(current_app.config['LEAVE_ENTITLEMENTS'])}")
+    if end < start:
+        raise LeaveError('end_date must not be before start_date')
+
+    if leave_days(start, end) == 0:
+        raise LeaveError('The leave has no working days')
+
+    lock_employee_leave(employee_id)
+
+    overlap = find_overlap(employee_id, start, end)
+    if overlap is not None:
+        db.session.rollback()
+        raise LeaveError(f'The leave overlaps leave request {overlap}', 409)
+
+    for year, _ in days_by_year(start, end):
+        _ensure_balance(employee_id, leave_type, year)
+    if not _adjust_balances(employee_id, leave_type, start, end, pending=1, check=True):
+        db.session.rollback()
+        raise LeaveError(f'Not enough {leave_type} leave days left', 409)
+
+    start_at, end_at = _period(start, end)
+    leave_request = LeaveRequest(employee_id=employee_id, leave_type=leave_type,
+                                 start_date=start_at, end_date=end_at, reason=reason)
+    db.session.add(leave_request)
+    db.session.commit()
+    invalidate_calendar(start, end)
+    return leave_request
+
+
+def _transition(leave_id, from_statuses, status, *conditions, **values):
+    """move a request from one of `from_statuses` to `status` in one UPDATE
+
+    returns:
+        LeaveRequest: the updated request
+    """
+    leave_request = db.session.execute(
+        update(LeaveRequest)
+        .where(LeaveRequest.leave_id == leave_id, LeaveRequest.status.in_(from_statuses),
+               *conditions)
+        .values(status=status, updated_at=datetime.now(timezone.utc), **values)
+        .returning(LeaveRequest)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if leave_request is None:
+        db.session.rollback()
+        raise LeaveError('Leave request not found or not in a state allowing this', 409)
+    return leave_request
+
+
+def _move_days(leave_request, pending=0, used=0):
+    _adjust_balances(leave_request.employee_id, leave_request.leave_type,
+                     leave_request.start_date.date(), leave_request.end_date.date(),
+                     pending=pending, used=used)
+
+
+def _leave_changed(leave_request):
+    invalidate_calendar(leave_request.start_date.date(), leave_request.end_date.date())
+
+
+def approve_leave(leave_id, approver_id):
+    leave_request = _transition(leave_id, ['Pending'], 'Approved', approved_by=approver_id)
+    _move_days(leave_request, pending=-1, used=1)
+    db.session.commit()
+    _leave_changed(leave_request)
+    return leave_request
+
+
+def reject_leave(leave_id, approver_id):
+    leave_request = _transition(leave_id, ['Pending'], 'Rejected', approved_by=approver_id)
+    _move_days(leave_request, pending=-1)
+    db.session.commit()
+    _leave_changed(leave_request)
+    return leave_request
+
+
+def cancel_leave(leave_id, employee_id):
+    """cancel a pending request, or an approved one that has not started"""
+    owner = LeaveRequest.employee_id == employee_id
+    try:
+        leave_request = _transition(leave_id, ['Pending'], 'Cancelled', owner)
+        _move_days(leave_request, pending=-1)
+    except LeaveError:
+        leave_request = _transition(leave_id, ['Approved'], 'Cancelled', owner,
+                                    LeaveRequest.start_date > datetime.now(timezone.utc))
+        _move_days(leave_request, used=-1)
+
+    db.session.commit()
+    _leave_changed(leave_request)
+    return leave_request
+
+
+def get_balances(employee_id, year=None):
+    """balances of every leave type of an employee for a year"""
+    year = year or date.today().year
+    balances = {
+        balance.leave_type: balance for balance in db.session.scalars(
+            select(LeaveBalance).where(LeaveBalance.employee_id == employee_id,
+                                       LeaveBalance.year == year)
+        )
+    }
+
+    result = []
+    for leave_type, entitled in current_app.config['LEAVE_ENTITLEMENTS'].items():
+        balance = balances.get(leave_type)
+        if balance is not None:
+            entitled = balance.entitled_days
+        pending = balance.pending_days if balance else 0
+        used = balance.used_days if balance else 0
+        result.append({
+            'leave_type': leave_type,
+            'year': year,
+            'entitled_days': entitled,
+            'pending_days': pending,
+            'used_days': used,
+            'remaining_days': None if entitled is None else entitled - pending - used
+        })
+    return result
@@ -2,10 +2,15 @@ from .public import (
     User, 
     UserOrganization, 
     Organization, 
-    Invited_Users
+    Invited_Users,
+    SpareSchema,
+    ProvisioningJob,
+    EmailOutbox
 )
 
 from .tenant import (
     LeaveRequest,
-    Attendance
+    LeaveBalance,
+    Attendance,
+    DailyAttendanceSummary
 )
\ No newline at end of file
@@ -1,29 +1,32 @@
 from datetime import datetime, timezone
 from typing import Optional
-from flask import current_app
+from flask import current_app, g
 from time import time
+from uuid import uuid4
 
 from sqlalchemy import (
     Integer, 
     String, 
+    Text,
     ForeignKey, 
     Boolean, 
-    DateTime
+    DateTime,
+    Index,
+    select
 )
 
 from sqlalchemy.orm import ( 
     Mapped, 
     mapped_column, 
+    make_transient_to_detached
 )
-
-from werkzeug.security import (
-    generate_password_hash,
-    check_password_hash
-)
+from sqlalchemy.orm.util import identity_key
 
 import jwt as jwt_serializer
 from tunga_hr_app import db, jwt
 from ..utils.applications import generate_organization_code
+from ..utils.cache import get_cache
+from ..utils.security import hash_password, verify_password
 
 
 class User(db.Model):
@@ -53,21 +56,19 @@ class User(db.Model):
         raise AttributeError('Password cannot be accessed')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
     
     def get_organization_id(self):
-        return UserOrganization.query.filter_by(user_id=self.user_id).first().organization_id
+        return get_user_organization(self.user_id)['organization_id']
     
     def get_organization(self):
-        organization_id = UserOrganization.query.filter_by(user_id=self.user_id).first()
-        return Organization.query.filter_by(organization_id=organization_id.organization_id).first().organization_code
+        return get_user_organization(self.user_id)['organization_code']
     
     def get_organization_name(self):
-        organization_id = UserOrganization.query.filter_by(user_id=self.user_id).first()
-        return Organization.query.filter_by(organization_id=organization_id.organization_id).first().organization_name
+        return get_user_organization(self.user_id)['organization_name']
     
     def get_account_confirmation_token(self, expires_in=600000):
         return jwt_serializer.encode(
@@ -93,6 +94,72 @@ class User(db.Model):
     def __repr__(self):
         return f'<User: {self.email}> - Organization: {self.organization_id}>'
 
+# Columns kept in the cached user snapshots, the password hash is left out
+# and loaded on access
+USER_SNAPSHOT_FIELDS = [column.key for column in User.__table__.columns 
+                        if column.key != 'password_hash']
+
+
+def _snapshot_key(cache, user_id):
+    """key of the cached snapshot of a user, None if there is no such user
+
+    Invalidations of a shared cache backend reach every worker, so its
+    snapshots are keyed by user_id. Other workers never see the
+    invalidations of an in-process cache, so its key also holds the
+    updated_at of the row, read by primary key, and a snapshot stops
+    matching as soon as the user changes.
+    """
+    if cache.backend is not None:
+        return user_id
+
+    updated_at = db.session.scalar(select(User.updated_at).where(User.user_id == user_id))
+    if updated_at is None:
+        return None
+    return (user_id, updated_at)
+
+
+def load_user(user_id):
+    """Load a user at most once per request
+
+    Repeated lookups in a request are served by the session identity map
+    and the first one by a cached snapshot of the user (USER_CACHE_TTL)
+    that stops being served once the user changes, see `_snapshot_key`.
+    """
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    user = db.session.identity_map.get(identity_key(User, user_id))
+    if user is not None:
+        return user
+
+    cache = get_cache('user')
+    key = _snapshot_key(cache, user_id)
+    if key is None:
+        return None
+
+    snapshot = cache.get(key)
+    if snapshot is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            cache.set(key, {field: getattr(user, field) for field in USER_SNAPSHOT_FIELDS})
+        return user
+
+    user = User.__mapper__.class_manager.new_instance()
+    for field, value in snapshot.items():
+        setattr(user, field, value)
+    make_transient_to_detached(user)
+    db.session.add(user)
+    return user
+
+
+def invalidate_user(user_id):
+    """drop the snapshot of a user from a shared cache, in-process snapshots
+    stop matching once the row's updated_at changes"""
+    get_cache('user').delete(int(user_id))
+
+
 # callback function that takes whatever object is passed in as the
 # identity when creating JWTs and converts it to a JSON serializable format.
 @jwt.user_identity_loader
@@ -104,7 +171,7 @@ def user_identity_lookup(user):
 @jwt.user_lookup_loader
 def user_lookup_callback(_jwt_header, jwt_data):
     identity = jwt_data["sub"]
-    return User.query.filter_by(user_id=identity).one_or_none()
+    return load_user(identity)
 
 
 class Organization(db.Model):
@@ -132,14 +199,45 @@ class Organization(db.Model):
             setattr(self, 'organization_code', generate_organization_code(data['organization_name'])) 
             
 
+    def to_snapshot(self):
+        return {field: getattr(self, field) for field in ORGANIZATION_SNAPSHOT_FIELDS}
+
     def __repr__(self):
         return f'<Organization: {self.organization_name}> - ID: {self.organization_id}>'
 
+
+ORGANIZATION_SNAPSHOT_FIELDS = [column.key for column in Organization.__table__.columns]
+
+
+def get_organization_snapshot(organization_id):
+    """Return the cached snapshot (a dict of its columns) of an organization"""
+    cache = get_cache('organization')
+    snapshot = cache.get(int(organization_id))
+    if snapshot is None:
+        organization = db.session.get(Organization, int(organization_id))
+        if organization is None:
+            return None
+        snapshot = organization.to_snapshot()
+        cache.set(organization.organization_id, snapshot)
+    return snapshot
+
+
+def invalidate_organization(organization_id):
+    get_cache('organization').delete(int(organization_id))
+    memo = g.get('_user_organizations', {})
+    for user_id in [user_id for user_id, snapshot in memo.items() 
+                    if snapshot and snapshot['organization_id'] == int(organization_id)]:
+        del memo[user_id]
+
     
 class UserOrganization(db.Model):
 
     __bind_key__ = "public"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        Index('ix_public_user_organization_organization_id_user_id', 
+              'organization_id', 'user_id'),
+        {"schema": "public"}
+    )
 
     user_id: Mapped[Optional[int]] = mapped_column(Integer,
                                                     ForeignKey(User.user_id), 
@@ -150,16 +248,56 @@ class UserOrganization(db.Model):
                                                     primary_key=True)
 
 
+
+def get_user_organization(user_id):
+    """Return the organization snapshot of a user, None if they have none
+
+    served from the request memo, then the shared organization cache, and
+    otherwise fetched with membership and organization in one query
+    """
+    memo = g.setdefault('_user_organizations', {})
+    user_id = int(user_id)
+    if user_id in memo:
+        return memo[user_id]
+
+    organization_id = get_cache('user_organization').get(user_id)
+    if organization_id is not None:
+        snapshot = get_organization_snapshot(organization_id)
+    else:
+        organization = db.session.scalars(
+            select(Organization)
+            .join(UserOrganization, UserOrganization.organization_id == Organization.organization_id)
+            .where(UserOrganization.user_id == user_id)
+            .limit(1)
+        ).first()
+
+        snapshot = None
+        if organization is not None:
+            snapshot = organization.to_snapshot()
+            get_cache('organization').set(organization.organization_id, snapshot)
+            get_cache('user_organization').set(user_id, organization.organization_id)
+
+    memo[user_id] = snapshot
+    return snapshot
+
+
 class Invited_Users(db.Model):
 
     __bind_key__ = "public"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        Index('ix_public_invited__users_organization_id_invite_id', 
+              'organization_id', 'invite_id'),
+        {"schema": "public"}
+    )
 
     invite_id: Mapped[int] = mapped_column(Integer, primary_key=True)
     email: Mapped[str] = mapped_column(String(120), index=True, nullable=True)
     job_title: Mapped[str] = mapped_column(String(120), nullable=True)
     role: Mapped[bool] = mapped_column(String(20), nullable=True)
-    invited_by: Mapped[int] = mapped_column(Integer) 
+    invited_by: Mapped[int] = mapped_column(Integer, index=True) 
+    organization_id: Mapped[Optional[int]] = mapped_column(Integer, 
+                                                           ForeignKey(Organization.organization_id), 
+                                                           nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, index=True, 
                                                  default=lambda: datetime.now(timezone.utc))
     updated_at: Mapped[datetime] = mapped_column(DateTime, index=True, 
@@ -193,4 +331,95 @@ class Invited_Users(db.Model):
         }
 
     def __repr__(self):
-        return f'<Invite: {self.email}> - by: {self.invited_by}>'
\ No newline at end of file
+        return f'<Invite: {self.email}> - by: {self.invited_by}>'
+
+
+class SpareSchema(db.Model):
+
+    __bind_key__ = "public"
+    __table_args__ = {"schema": "public"}
+
+    schema_name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    revision: Mapped[str] = mapped_column(String(32), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True, 
+                                                 default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<Spare Schema: {self.schema_name}> - Revision: {self.revision}>'
+
+
+
+class ProvisioningJob(db.Model):
+
+    __bind_key__ = "public"
+    __table_args__ = {"schema": "public"}
+
+    job_id: Mapped[str] = mapped_column(String(36), primary_key=True, 
+                                        default=lambda: str(uuid4()))
+    organization_id: Mapped[int] = mapped_column(Integer, 
+                                                 ForeignKey(Organization.organization_id), 
+                                                 index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey(User.user_id))
+    status: Mapped[str] = mapped_column(String(20), default='Pending') # Pending, Running, Complete, Failed
+    step: Mapped[str] = mapped_column(String(40), nullable=True) # schema, email
+    error: Mapped[str] = mapped_column(String(500), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True, 
+                                                 default=lambda: datetime.now(timezone.utc))
+    updated_at: Mapped[datetime] = mapped_column(DateTime, 
+                                                 default=lambda: datetime.now(timezone.utc), 
+                                                 onupdate=lambda: datetime.now(timezone.utc))
+
+    def get_status_token(self, expires_in=86400):
+        return jwt_serializer.encode(
+            {'provisioning_job': self.job_id, 'exp': time() + expires_in},
+            current_app.config['SECRET_KEY'], algorithm='HS256')
+
+    def verify_status_token(self, token):
+        try:
+            job_id = jwt_serializer.decode(token, current_app.config['SECRET_KEY'],
+                            algorithms=['HS256'])['provisioning_job']
+        except Exception:
+            return False
+        return job_id == self.job_id
+
+    def to_dict(self):
+        return {
+            'provisioning_id': self.job_id,
+            'status': self.status,
+            'step': self.step,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+    def __repr__(self):
+        return f'<Provisioning Job: {self.job_id}> - Status: {self.status}>'
+
+
+
+class EmailOutbox(db.Model):
+
+    __bind_key__ = "public"
+    __table_args__ = (
+        Index('ix_public_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        {"schema": "public"}
+    )
+
+    email_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    subject: Mapped[str] = mapped_column(String(255))
+    sender: Mapped[str] = mapped_column(String(120), nullable=True)
+    recipients: Mapped[str] = mapped_column(Text) # comma separated
+    html_body: Mapped[str] = mapped_column(Text)
+    text_body: Mapped[str] = mapped_column(Text, nullable=True)
+    status: Mapped[str] = mapped_column(String(20), default='Pending') # Pending, Sent, Failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str] = mapped_column(String(500), nullable=True)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, 
+                                                      default=lambda: datetime.now(timezone.utc))
+    locked_until: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True, 
+                                                 default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<Email: {self.email_id}> - {self.subject} - Status: {self.status}>'
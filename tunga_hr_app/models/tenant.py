@@ -1,9 +1,13 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
+from typing import Optional
 
 from sqlalchemy import (
     Integer, 
     String, 
-    DateTime
+    Date,
+    DateTime,
+    Index,
+    text
 )
 
 from sqlalchemy.orm import ( 
@@ -13,16 +17,30 @@ from sqlalchemy.orm import (
 
 from tunga_hr_app import db
 
+# Statuses of leave that holds days and blocks overlapping requests
+ACTIVE_LEAVE_STATUSES = ('Pending', 'Approved', 'In Progress')
+
+
 class LeaveRequest(db.Model):
 
+    __table_args__ = (
+        Index('ix_leave_request_employee_id_start_date', 'employee_id', 'start_date'),
+        # Range index for the overlap checks of active leave
+        Index('ix_leave_request_active_period', 
+              text("tsrange(start_date, end_date, '[]')"),
+              postgresql_using='gist',
+              postgresql_where=text("status IN ('Pending', 'Approved', 'In Progress')")
+              ).ddl_if(dialect='postgresql'),
+    )
+
     leave_id: Mapped[int] = mapped_column(Integer, primary_key=True)
     employee_id: Mapped[int] = mapped_column(Integer, nullable=False)
     start_date: Mapped[datetime] = mapped_column(DateTime, index=True, nullable=True)
     end_date: Mapped[datetime] = mapped_column(DateTime, index=True, nullable=True)
     leave_type: Mapped[str] = mapped_column(String(50), nullable=False)
     reason: Mapped[str] = mapped_column(String(500), nullable=True)
-    status: Mapped[str] = mapped_column(String(20), default='Pending', nullable=False) # Pending, Approved, Rejected, In Progress, Complete
-    approved_by: Mapped[int] = mapped_column(Integer, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), default='Pending', nullable=False) # Pending, Approved, Rejected, Cancelled, In Progress, Complete
+    approved_by: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, index=True, 
                                                  default=lambda: datetime.now(timezone.utc))
     updated_at: Mapped[datetime] = mapped_column(DateTime, index=True, 
@@ -30,12 +48,63 @@ class LeaveRequest(db.Model):
                                                  onupdate=lambda: datetime.now(timezone.utc))
 
 
+    def to_dict(self):
+        return {
+            'leave_id': self.leave_id,
+            'employee_id': self.employee_id,
+            'leave_type': self.leave_type,
+            'start_date': self.start_date.date().isoformat() if self.start_date else None,
+            'end_date': self.end_date.date().isoformat() if self.end_date else None,
+            'reason': self.reason,
+            'status': self.status,
+            'approved_by': self.approved_by,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
     def __repr__(self):
         return f'<Leave Request: {self.leave_id} - {self.employee_id} - {self.leave_type} - {self.status}>'
+
+
+
+def leave_request_row_to_dict(row):
+    """`LeaveRequest.to_dict` for a row selecting the leave_request columns"""
+    leave_request = dict(row._mapping)
+    for field in ('start_date', 'end_date'):
+        if leave_request[field]:
+            leave_request[field] = leave_request[field].date().isoformat()
+    return leave_request
+    
+
+class LeaveBalance(db.Model):
+    """Leave days of an employee for one type and year, updated as requests
+    are submitted, approved, rejected and cancelled"""
+
+    employee_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    leave_type: Mapped[str] = mapped_column(String(50), primary_key=True)
+    year: Mapped[int] = mapped_column(Integer, primary_key=True)
+    entitled_days: Mapped[Optional[int]] = mapped_column(Integer, nullable=True) # None for no limit
+    pending_days: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    used_days: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, 
+                                                 default=lambda: datetime.now(timezone.utc), 
+                                                 onupdate=lambda: datetime.now(timezone.utc))
+
+
+    def __repr__(self):
+        return f'<Leave Balance: {self.employee_id} - {self.leave_type} - {self.year}>'
     
 
 class Attendance(db.Model):
 
+    __table_args__ = (
+        Index('ix_attendance_employee_id_clock_in', 'employee_id', 'clock_in'),
+        # At most one open shift per employee, clock-ins conflict on it
+        Index('ix_attendance_open_shift', 'employee_id', unique=True,
+              postgresql_where=text('clock_out IS NULL'),
+              sqlite_where=text('clock_out IS NULL')),
+    )
+
     attendance_id: Mapped[int] = mapped_column(Integer, primary_key=True)
     employee_id: Mapped[int] = mapped_column(Integer, nullable=False)
     clock_in: Mapped[datetime] = mapped_column(DateTime, index=True, 
@@ -50,3 +119,22 @@ class Attendance(db.Model):
 
     def __repr__(self):
         return f'<Attendance: {self.attendance_id} - {self.employee_id} - {self.clock_in}>'
+
+
+class DailyAttendanceSummary(db.Model):
+    """Worked time of an employee on one (UTC) day, kept up to date as
+    shifts close"""
+
+    employee_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    work_date: Mapped[date] = mapped_column(Date, primary_key=True, index=True)
+    worked_seconds: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    shifts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    first_clock_in: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    last_clock_out: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, 
+                                                 default=lambda: datetime.now(timezone.utc), 
+                                                 onupdate=lambda: datetime.now(timezone.utc))
+
+
+    def __repr__(self):
+        return f'<Daily Attendance: {self.employee_id} - {self.work_date} - {self.worked_seconds}s>'
@@ -0,0 +1,119 @@
+"""In-process caches
+
+for values that are read on every request and rarely change
+"""
+import pickle
+from collections import OrderedDict
+from os import getpid
+from threading import Lock
+from time import monotonic
+
+from flask import current_app
+
+
+class TTLCache:
+    """bounded least recently used cache whose entries expire after `ttl` seconds
+
+    When a shared `backend` is given (any client with redis style `get`,
+    `set(..., ex=)` and `delete`, e.g. `redis.Redis`) values are kept there
+    instead of in process memory, so an invalidation done by one gunicorn
+    worker is seen by all of them.
+    """
+
+    def __init__(self, namespace, max_size=10000, ttl=60, backend=None):
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self._reset()
+
+    def _reset(self):
+        self._pid = getpid()
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    def _check_fork(self):
+        if self._pid != getpid():
+            self._reset()
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key, default=None):
+        if self.backend is not None:
+            value = self.backend.get(self._key(key))
+            return default if value is None else pickle.loads(value)
+
+        self._check_fork()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] < monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        if self.backend is not None:
+            self.backend.set(self._key(key), pickle.dumps(value), ex=self.ttl)
+            return
+
+        self._check_fork()
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        if self.backend is not None:
+            self.backend.delete(self._key(key))
+            return
+
+        self._check_fork()
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._check_fork()
+        with self._lock:
+            self._entries.clear()
+
+
+def get_cache_backend():
+    """return the shared cache backend configured by CACHE_REDIS_URL, if any"""
+    url = current_app.config.get("CACHE_REDIS_URL")
+    if not url:
+        return None
+
+    backend = current_app.extensions.get("cache_backend")
+    if backend is None:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_REDIS_URL is set but redis is not installed")
+        backend = current_app.extensions.setdefault(
+            "cache_backend", redis.Redis.from_url(url)
+        )
+    return backend
+
+
+def get_cache(name):
+    """return the named cache of the current application
+
+    its size and ttl are read from the <NAME>_CACHE_SIZE and
+    <NAME>_CACHE_TTL config values
+    """
+    caches = current_app.extensions.setdefault("caches", {})
+    cache = caches.get(name)
+    if cache is None:
+        prefix = name.upper()
+        cache = caches.setdefault(name, TTLCache(
+            namespace=name,
+            max_size=current_app.config.get(f"{prefix}_CACHE_SIZE", 10000),
+            ttl=current_app.config.get(f"{prefix}_CACHE_TTL", 60),
+            backend=get_cache_backend()
+        ))
+    return cache
@@ -1,6 +1,16 @@
 """Database related functions"""
-from os import popen
-from sqlalchemy import text
+import io
+import os
+from collections import OrderedDict
+from os import getpid
+from threading import RLock
+
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import event, text
 from sqlalchemy.schema import CreateSchema
 from sqlalchemy.exc import InternalError
 from sqlalchemy.orm import sessionmaker, scoped_session
@@ -8,27 +18,300 @@ from sqlalchemy.orm import sessionmaker, scoped_session
 from tunga_hr_app import db
 
 
-class Database:
-    """used for managing tenant databases related operations"""
+def quote_schema(schema):
+    """quote a schema name for use in raw SQL"""
+    return '"{}"'.format(str(schema).replace('"', '""'))
 
-    def __init__(self, tenant: str) -> None:
-        self.schema = str(tenant)
 
-    def get_engine(self):
-        """create new schema engine"""
-        return db.engine.execution_options(
-            schema_translate_map={None: self.schema}
+def current_tenant_schema():
+    """return the tenant schema bound to the current request, if any"""
+    if has_app_context():
+        return g.get("tenant_schema")
+    return None
+
+
+def _search_path_connect(dbapi_connection, connection_record):
+    # new connections start with the server default search_path
+    connection_record.info["search_path"] = None
+
+
+def _search_path_checkout(dbapi_connection, connection_record, connection_proxy):
+    schema = current_tenant_schema()
+    if connection_record.info.get("search_path", False) == schema:
+        return
+
+    cursor = dbapi_connection.cursor()
+    if schema is None:
+        cursor.execute("SET search_path TO DEFAULT")
+    else:
+        cursor.execute(f"SET search_path TO {quote_schema(schema)}")
+    cursor.close()
+    dbapi_connection.commit()
+    connection_record.info["search_path"] = schema
+
+
+def _search_path_checkin(dbapi_connection, connection_record):
+    if dbapi_connection is None or connection_record.info.get("search_path") is None:
+        return
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute("SET search_path TO DEFAULT")
+    cursor.close()
+    dbapi_connection.commit()
+    connection_record.info["search_path"] = None
+
+
+def _search_path_commit(connection):
+    connection.info.pop("search_path_pending", None)
+
+
+def _search_path_rollback(connection):
+    # a search_path set inside the rolled back transaction is undone
+    if connection.info.pop("search_path_pending", False):
+        connection.info.pop("search_path", None)
+
+
+def _search_path_reset(dbapi_connection, connection_record, reset_state):
+    if connection_record.info.pop("search_path_pending", False):
+        connection_record.info.pop("search_path", None)
+
+
+def _translate_tenant_schema(orm_execute_state):
+    schema = current_tenant_schema()
+    if schema is not None and \
+            current_app.config["TENANT_BINDING_MODE"] == "translate":
+        orm_execute_state.update_execution_options(
+            schema_translate_map={None: schema}
         )
 
-    def get_session(self):
-        """To get session of tenant/public database schema for quick use
 
-        returns:
-            session: session of tenant/public database schema
+def _translate_tenant_connection(session, transaction, connection):
+    # flushes do not go through do_orm_execute, the connection itself
+    # carries the map for them
+    schema = current_tenant_schema()
+    if schema is not None and \
+            current_app.config["TENANT_BINDING_MODE"] == "translate":
+        connection.execution_options(schema_translate_map={None: schema})
+
+
+def bind_tenant_engine(engine, reset_on_checkin=False):
+    """keep the search_path of pooled connections on the request's tenant
+
+    the schema is applied when a connection is checked out and only when
+    the connection does not already point at it
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    event.listen(engine, "connect", _search_path_connect)
+    event.listen(engine, "checkout", _search_path_checkout)
+    event.listen(engine, "commit", _search_path_commit)
+    event.listen(engine, "rollback", _search_path_rollback)
+    event.listen(engine, "reset", _search_path_reset)
+    if reset_on_checkin:
+        event.listen(engine, "checkin", _search_path_checkin)
+
+
+def init_tenant_binding(app):
+    """set up how tenant schemas are bound to requests
+
+    TENANT_BINDING_MODE can be:
+     - search_path: pooled connections get the tenant search_path on checkout
+     - translate: ORM statements and the connections of the session get a
+       schema_translate_map for the tenant
+    """
+    if app.config["TENANT_BINDING_MODE"] == "translate":
+        if not event.contains(db.session, "do_orm_execute", _translate_tenant_schema):
+            event.listen(db.session, "do_orm_execute", _translate_tenant_schema)
+        if not event.contains(db.session, "after_begin", _translate_tenant_connection):
+            event.listen(db.session, "after_begin", _translate_tenant_connection)
+    else:
+        bind_tenant_engine(db.engine, app.config["TENANT_RESET_ON_CHECKIN"])
+
+
+_tenant_heads = {}
+
+
+def get_tenant_head():
+    """return the head revision of the tenant migrations
+
+    resolved in-process with alembic and cached until the versions
+    directory of TENANT_MIGRATIONS_DIR changes
+    """
+    directory = current_app.config["TENANT_MIGRATIONS_DIR"]
+    mtime = os.stat(os.path.join(directory, "versions")).st_mtime_ns
+
+    cached = _tenant_heads.get(directory)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, ScriptDirectory(directory).get_current_head())
+        _tenant_heads[directory] = cached
+    return cached[1]
+
+
+def dialect_insert(table, bind=None):
+    """return the INSERT construct of the database dialect
+
+    it supports ON CONFLICT on PostgreSQL and SQLite
+    """
+    name = (bind or db.engine).dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"INSERT ... ON CONFLICT is not supported on {name}")
+    return insert(table)
+
+
+TENANT_PLACEHOLDER = "__tenant__"
+_tenant_ddl = {}
+
+
+def render_tenant_migrations(dialect):
+    """SQL of the tenant migrations from base to head
+
+    the revisions are rendered offline, as `alembic upgrade --sql` would,
+    with unqualified table names. Data steps that need a live connection
+    skip themselves when `op.get_context().as_sql` is set.
+    """
+    buffer = io.StringIO()
+    context = MigrationContext.configure(
+        dialect_name=dialect.name,
+        opts={"as_sql": True, "output_buffer": buffer, "literal_binds": True}
+    )
+    script = ScriptDirectory(current_app.config["TENANT_MIGRATIONS_DIR"])
+    with Operations.context(context):
+        for revision in reversed(list(script.walk_revisions("base", "heads"))):
+            revision.module.upgrade()
+    return buffer.getvalue().strip()
+
+
+def get_tenant_ddl(dialect):
+    """return the DDL script that stamps a tenant schema at the migrations head
+
+    the script creates the schema, runs the tenant migrations rendered as SQL
+    inside it and creates the alembic_version table in one batch, so new
+    tenants get exactly the schema of migrated ones. It is generated once
+    per head revision with TENANT_PLACEHOLDER in place of the schema name.
+    """
+    head = get_tenant_head()
+    ddl = _tenant_ddl.get((head, dialect.name))
+    if ddl is not None:
+        return ddl
+
+    ddl = "\n".join([
+        f"CREATE SCHEMA IF NOT EXISTS {TENANT_PLACEHOLDER};",
+        # reverts when the transaction creating the tenant ends
+        f"SET LOCAL search_path TO {TENANT_PLACEHOLDER};",
+        render_tenant_migrations(dialect),
+        "CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL, "
+        "CONSTRAINT alembic_version_pkc PRIMARY KEY (version_num));",
+        f"INSERT INTO alembic_version (version_num) VALUES ('{head}');",
+    ])
+    return _tenant_ddl.setdefault((head, dialect.name), ddl)
+
+
+class TenantRegistry:
+    """keeps one engine view and session factory per tenant schema
+
+    Entries live for the life of the worker process and the least recently
+    used tenant is evicted once `max_size` schemas are registered. The
+    registry resets itself when it finds it is running in a forked worker,
+    so sessions created by the gunicorn master are never shared.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._reset()
+
+    def _reset(self):
+        self._pid = getpid()
+        self._lock = RLock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_fork(self):
+        if self._pid != getpid():
+            self._reset()
+
+    def get(self, schema):
+        """return the (engine, session) pair of a tenant schema
+
+        args:
+            schema: name of the tenant/public database schema
         """
-        return scoped_session(
-            sessionmaker(bind=self.get_engine(), expire_on_commit=True)
+        self._check_fork()
+        engine = db.engine
+
+        with self._lock:
+            entry = self._entries.get(schema)
+            if entry is not None and entry[0] is engine:
+                self._entries.move_to_end(schema)
+                self.hits += 1
+                return entry[1], entry[2]
+
+            self.misses += 1
+            tenant_engine = engine.execution_options(
+                schema_translate_map={None: schema}
+            )
+            session = scoped_session(
+                sessionmaker(bind=tenant_engine, expire_on_commit=True)
+            )
+            if entry is not None:
+                entry[2].remove()
+            self._entries[schema] = (engine, tenant_engine, session)
+            self._entries.move_to_end(schema)
+
+            while len(self._entries) > self.max_size:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                evicted.remove()
+                self.evictions += 1
+
+            return tenant_engine, session
+
+    def evict(self, schema):
+        """drop a tenant schema from the registry"""
+        self._check_fork()
+        with self._lock:
+            entry = self._entries.pop(schema, None)
+            if entry is not None:
+                entry[2].remove()
+
+    def stats(self):
+        """hit/miss/eviction counters of the registry"""
+        self._check_fork()
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def get_tenant_registry():
+    """return the tenant registry of the current application"""
+    registry = current_app.extensions.get("tenant_registry")
+    if registry is None:
+        registry = current_app.extensions.setdefault(
+            "tenant_registry",
+            TenantRegistry(current_app.config["TENANT_REGISTRY_SIZE"])
         )
+    return registry
+
+
+class Database:
+    """used for managing tenant databases related operations"""
+
+    def __init__(self, tenant: str) -> None:
+        self.schema = str(tenant)
+
+    def get_engine(self):
+        """get the cached schema engine"""
+        return get_tenant_registry().get(self.schema)[0]
 
     def create_schema(self):
         """create new database schema, mostly used on tenant creation"""
@@ -39,47 +322,77 @@ class Database:
             db.session.rollback()
             db.session.close()
 
-    def create_tables(self):
-        """create tables in for schema"""
-        db.metadata.create_all(self.get_engine())
-
     def switch_schema(self):
-        """switch between tenant/public database schema"""
-        db.session.execute(text(f'set search_path to "{self.schema}"'))
-        db.session.commit()
-
-    def migrate_tenant_schema(self):
-        """migrate tenant database schema for new tenant"""
-        # Get the current revision for a database.
-        # NOTE: using popen may have a minor performance impact on the application
-        # you can store it in a different table in public schema and use it from there
-        # may be a faster approach
-        last_revision = popen("flask db heads -d migrations/tenant").read()
-        last_revision = last_revision.splitlines()[-1].split(" ")[0]
+        """bind the tenant/public database schema to the current request
+
+        connections checked out from now on are pointed at the schema, a
+        connection the session already holds is switched in place
+        """
+        g.tenant_schema = self.schema
+
+        if current_app.config["TENANT_BINDING_MODE"] == "translate":
+            # a transaction begun before the switch has untranslated connections
+            if db.session().in_transaction():
+                _translate_tenant_connection(db.session, None, db.session.connection())
+            return
+
+        if current_app.config["TENANT_BINDING_MODE"] != "search_path" or \
+                db.engine.dialect.name != "postgresql" or \
+                not db.session().in_transaction():
+            return
+
+        connection = db.session.connection()
+        if connection.info.get("search_path", False) != self.schema:
+            connection.exec_driver_sql(
+                f"SET search_path TO {quote_schema(self.schema)}"
+            )
+            connection.info["search_path"] = self.schema
+            connection.info["search_path_pending"] = True
+
+    def migrate_tenant_schema(self, connection=None):
+        """stamp the tenant database schema with the tenant migrations head
+
+        args:
+            connection: connection to run in, a new transaction is used if
+                not given
+        """
+        if connection is None:
+            with self.get_engine().begin() as connection:
+                return self.migrate_tenant_schema(connection)
 
         # creating revision table in tenant schema
-        session = self.get_session()
-        session.execute(
+        connection.execute(
             text(
-                f'CREATE TABLE "{self.schema}".alembic_version (version_num '
-                "VARCHAR(32) NOT NULL)"
+                f"CREATE TABLE {quote_schema(self.schema)}.alembic_version "
+                "(version_num VARCHAR(32) NOT NULL)"
             )
         )
-        session.commit()
 
         # Insert last revision to alembic_version table
-        session.execute(
+        connection.execute(
             text(
-                f'INSERT INTO "{self.schema}".alembic_version (version_num) '
-                "VALUES (:version)"
+                f"INSERT INTO {quote_schema(self.schema)}.alembic_version "
+                "(version_num) VALUES (:version)"
             ),
-            {"version": last_revision},
+            {"version": get_tenant_head()},
         )
-        session.commit()
-        session.close()
 
     def create_tenant_schema(self):
-        """create tenant used for creating new schema and its tables"""
-        self.create_schema()
-        self.create_tables()
-        self.migrate_tenant_schema()
\ No newline at end of file
+        """create tenant used for creating new schema and its tables
+
+        the schema, its tables and the alembic version are created in a
+        single transaction, on PostgreSQL with one round trip of the tenant
+        DDL script
+        """
+        with self.get_engine().begin() as connection:
+            if connection.dialect.name == "postgresql":
+                connection.exec_driver_sql(
+                    get_tenant_ddl(connection.dialect).replace(
+                        TENANT_PLACEHOLDER, quote_schema(self.schema)
+                    )
+                )
+                return
+
+            connection.execute(CreateSchema(self.schema, if_not_exists=True))
+            db.metadata.create_all(connection)
+            self.migrate_tenant_schema(connection)
@@ -0,0 +1,92 @@
+"""Streaming exports
+
+writes query results as NDJSON or CSV while they are fetched, so an export
+holds one batch of rows in memory whatever the size of the result
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date
+
+from flask import Response, current_app, request, stream_with_context
+
+from tunga_hr_app import db
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def iter_ndjson(rows, fields):
+    for row in rows:
+        yield json.dumps({field: row._mapping[field] for field in fields},
+                         default=_json_default) + '\n'
+
+
+def iter_csv(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([row._mapping[field] for field in fields])
+    yield buffer.getvalue()
+
+
+def iter_chunks(lines, chunk_size):
+    """join lines into chunks of about `chunk_size` bytes"""
+    chunk, size = [], 0
+    for line in lines:
+        data = line.encode()
+        chunk.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+def iter_gzip(chunks):
+    """gzip a stream of chunks as it goes"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(query, fields, filename, export_format):
+    """Stream the rows of a select in `export_format`
+
+    rows are fetched EXPORT_BATCH_SIZE at a time through a server side
+    cursor and the response is gzipped on the fly when the client accepts it
+    """
+    rows = db.session.execute(
+        query.execution_options(yield_per=current_app.config['EXPORT_BATCH_SIZE'])
+    )
+    lines = iter_csv(rows, fields) if export_format == 'csv' else iter_ndjson(rows, fields)
+    body = iter_chunks(lines, current_app.config['EXPORT_CHUNK_SIZE'])
+
+    headers = {
+        'Content-Disposition': f'attachment; filename={filename}.{export_format}',
+        'Vary': 'Accept-Encoding',
+    }
+    if 'gzip' in request.accept_encodings:
+        body = iter_gzip(body)
+        headers['Content-Encoding'] = 'gzip'
+
+    return Response(stream_with_context(body),
+                    mimetype=EXPORT_FORMATS[export_format],
+                    headers=headers)
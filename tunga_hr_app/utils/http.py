@@ -0,0 +1,52 @@
+"""Conditional GET
+
+lets read endpoints answer If-None-Match and If-Modified-Since with a 304
+from their validators alone, before any query or serialization of the body
+"""
+from datetime import timezone
+from hashlib import sha1
+
+from flask import make_response, request
+
+
+def make_etag(*parts):
+    """ETag of the values a response is derived from"""
+    return sha1(repr(parts).encode()).hexdigest()
+
+
+def _as_utc(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def add_validators(response, etag, last_modified=None):
+    """set the ETag, Last-Modified and Cache-Control headers of a response
+
+    responses are private to the user and revalidated on every use
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _as_utc(last_modified)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Authorization')
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response when the client's copy is current, else None
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110
+    """
+    if request.if_none_match:
+        current = request.if_none_match.contains(etag) or request.if_none_match.star_tag
+    else:
+        current = request.if_modified_since is not None and last_modified is not None \
+            and _as_utc(last_modified) <= request.if_modified_since
+
+    if not current:
+        return None
+    return add_validators(make_response('', 304), etag, last_modified)
@@ -3,10 +3,70 @@
 for handling tenant requests
 """
 
+from flask import has_app_context
 from flask_jwt_extended import verify_jwt_in_request, get_jwt, get_jwt_identity
+from sqlalchemy import event, select
 
-from ..models.public import UserOrganization
+from ..models.public import UserOrganization, load_user
+from .cache import get_cache
 from .database import Database
+from .routing import RoutingSession
+
+
+def is_tenant_member(user_id, tenant):
+    """check if a user is a member of a tenant
+
+    memberships are cached per user for MEMBERSHIP_CACHE_TTL seconds
+    """
+    cache = get_cache("membership")
+    user_id, tenant = str(user_id), str(tenant)
+
+    tenants = cache.get(user_id, frozenset())
+    if tenant in tenants:
+        return True
+
+    if not UserOrganization.query.filter_by(user_id=user_id, organization_id=tenant).first():
+        return False
+
+    cache.set(user_id, tenants | {tenant})
+    return True
+
+
+def invalidate_membership(user_id):
+    """drop the cached memberships of a user"""
+    get_cache("membership").delete(str(user_id))
+    get_cache("user_organization").delete(int(user_id))
+
+
+@event.listens_for(UserOrganization, "after_delete")
+def _membership_deleted(mapper, connection, target):
+    if has_app_context():
+        invalidate_membership(target.user_id)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _memberships_bulk_deleted(orm_execute_state):
+    """invalidate the users of memberships removed by a bulk delete, which
+    skips the after_delete event"""
+    if not orm_execute_state.is_delete or not has_app_context() or \
+            orm_execute_state.bind_mapper is not UserOrganization.__mapper__:
+        return None
+
+    query = select(UserOrganization.user_id)
+    if orm_execute_state.statement.whereclause is not None:
+        query = query.where(orm_execute_state.statement.whereclause)
+    user_ids = orm_execute_state.session.scalars(query).all()
+
+    result = orm_execute_state.invoke_statement()
+    for user_id in user_ids:
+        invalidate_membership(user_id)
+    return result
+
+
+def is_admin():
+    """check if the user of the request is an admin"""
+    user = load_user(get_jwt_identity())
+    return user is not None and user.role == "Admin"
 
 
 def change_tenant_schema():
@@ -23,7 +83,7 @@ def change_tenant_schema():
 
     user = get_jwt_identity()
     
-    if not UserOrganization.query.filter_by(user_id=user, organization_id=tenant).first():
+    if not is_tenant_member(user, tenant):
         return {"message": "You are not a member of this tenant"}, 403
 
-    Database(tenant).switch_schema()
\ No newline at end of file
+    Database(tenant).switch_schema()
@@ -0,0 +1,35 @@
+"""Parallel tenant migrations
+
+worker side of the process pool used by the tenant migrations env.py. The
+pool pickles its task function by reference, so it has to live in an
+importable module rather than in the env.py that Alembic loads from a file.
+"""
+import time
+
+_worker = {}
+
+
+def init_migration_worker(engine, migrate):
+    """Initializer of the forked worker processes
+
+    args:
+        engine: engine of the parent process, whose pooled connections must
+            not be used by the workers
+        migrate: callable migrating one tenant on a connection of its own
+    """
+    engine.dispose(close=False)
+    _worker["migrate"] = migrate
+
+
+def migrate_tenant_worker(tenant):
+    """Migrate a single tenant in a worker process
+
+    returns:
+        tuple: (tenant, seconds taken, error or None)
+    """
+    started = time.perf_counter()
+    try:
+        _worker["migrate"](tenant)
+    except Exception as e:
+        return tenant, time.perf_counter() - started, repr(e)
+    return tenant, time.perf_counter() - started, None
@@ -0,0 +1,105 @@
+"""Keyset pagination
+
+pages through a query by the last sort key seen instead of an offset, so
+every page costs one index range scan whatever its position
+"""
+import base64
+import json
+from datetime import date, datetime, timedelta, timezone
+
+from flask import current_app, request
+from sqlalchemy import DateTime, tuple_
+
+from tunga_hr_app import db
+
+
+class InvalidPageArgument(ValueError):
+    """raised when a cursor, limit or filter argument cannot be used"""
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value
+              for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, keys):
+    """decode a cursor made by `encode_cursor` for the sort `keys`"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError()
+        return [datetime.fromisoformat(value) if isinstance(key.type, DateTime) else value
+                for key, value in zip(keys, values)]
+    except (ValueError, TypeError):
+        raise InvalidPageArgument('Invalid cursor')
+
+
+def get_limit():
+    """page size from the `limit` argument, capped at MAX_PER_PAGE"""
+    try:
+        limit = int(request.args.get('limit', current_app.config['USERS_PER_PAGE']))
+    except ValueError:
+        raise InvalidPageArgument('limit must be an integer')
+    if limit < 1:
+        raise InvalidPageArgument('limit must be positive')
+    return min(limit, current_app.config['MAX_PER_PAGE'])
+
+
+def get_bool_arg(name):
+    """boolean query argument, None when absent"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise InvalidPageArgument(f'{name} must be true or false')
+
+
+def read_date_range(whole_month=False):
+    """start and end dates of the request
+
+    by default from the first of the current month to today, or to the end
+    of the month with `whole_month`
+    """
+    today = datetime.now(timezone.utc).date()
+    default_end = today
+    if whole_month:
+        default_end = date(today.year + today.month // 12, today.month % 12 + 1, 1) - timedelta(days=1)
+    try:
+        start = date.fromisoformat(request.args['start']) if 'start' in request.args \
+            else today.replace(day=1)
+        end = date.fromisoformat(request.args['end']) if 'end' in request.args else default_end
+    except ValueError:
+        raise InvalidPageArgument('start and end must be dates (YYYY-MM-DD)')
+
+    if end < start:
+        raise InvalidPageArgument('end must not be before start')
+    if (end - start).days >= current_app.config['TIMESHEET_MAX_DAYS']:
+        raise InvalidPageArgument(f"at most {current_app.config['TIMESHEET_MAX_DAYS']} days can be requested")
+    return start, end
+
+
+def keyset_page(query, keys, cursor=None, limit=50, descending=False):
+    """Fetch one page of a select ordered by `keys`
+
+    `keys` must be columns of the select that together are unique, the last
+    one usually being the primary key.
+
+    returns:
+        tuple: the rows of the page and the cursor of the next page, None on
+        the last page
+    """
+    if cursor:
+        values = tuple_(*decode_cursor(cursor, keys))
+        query = query.where(tuple_(*keys) < values if descending else tuple_(*keys) > values)
+
+    query = query.order_by(*[key.desc() if descending else key for key in keys])
+    rows = db.session.execute(query.limit(limit + 1)).all()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([rows[-1]._mapping[key] for key in keys])
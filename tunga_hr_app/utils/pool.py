@@ -0,0 +1,118 @@
+"""Connection pool instrumentation
+
+for seeing when workers queue on database connections
+"""
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+from sqlalchemy import exc, make_url
+from sqlalchemy.pool import QueuePool
+
+from tunga_hr_app import db
+
+# upper bounds, in seconds, of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, float("inf"))
+
+# options only understood by QueuePool
+QUEUE_POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout")
+
+
+class PoolStats:
+    """checkout counters and wait time histogram of a pool"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.checkouts = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_histogram = [0] * len(WAIT_BUCKETS)
+
+    def record_checkout(self, wait, overflowed):
+        with self._lock:
+            self.checkouts += 1
+            self.overflow_events += overflowed
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.wait_histogram[bisect_left(WAIT_BUCKETS, wait)] += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+                "wait_avg": self.wait_total / self.checkouts if self.checkouts else 0.0,
+                "wait_max": self.wait_max,
+                "wait_histogram": {
+                    str(bucket): count
+                    for bucket, count in zip(WAIT_BUCKETS, self.wait_histogram)
+                },
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool recording how long checkouts wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = perf_counter()
+        overflow = self.overflow()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout()
+            raise
+        self.stats.record_checkout(perf_counter() - started,
+                                 self.overflow() > max(overflow, 0))
+        return connection
+
+
+def _in_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and \
+        (url.database in (None, "", ":memory:") or url.query.get("mode") == "memory")
+
+
+def init_pool_options(app):
+    """instrument the pools of the application engines
+
+    the engine options are copied into the application config so the config
+    class is never modified. In-memory SQLite runs on a StaticPool, which
+    takes no sizing options.
+    """
+    options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    if _in_memory_sqlite(app.config["SQLALCHEMY_DATABASE_URI"]):
+        for option in QUEUE_POOL_OPTIONS:
+            options.pop(option, None)
+    elif "pool_size" in options:
+        options.setdefault("poolclass", InstrumentedQueuePool)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def pool_stats():
+    """return the state and statistics of every engine pool"""
+    stats = {}
+    for bind_key, engine in db.engines.items():
+        pool = engine.pool
+        entry = {"status": pool.status()}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            })
+        if isinstance(pool, InstrumentedQueuePool):
+            entry.update(pool.stats.to_dict())
+        stats[bind_key or "default"] = entry
+    return stats
@@ -0,0 +1,212 @@
+"""Tenant schema provisioning
+
+keeps a pool of ready, fully migrated spare schemas that new
+organizations claim instead of creating their schema inline, and
+provisions new tenants in background jobs
+"""
+from datetime import datetime, timedelta, timezone
+from threading import Thread, Lock
+from uuid import uuid4
+
+from flask import current_app
+from sqlalchemy import and_, delete, func, or_, select, text, update
+
+from tunga_hr_app import db
+
+from ..models.public import SpareSchema, ProvisioningJob, User
+from .database import Database, get_tenant_head, get_tenant_registry, quote_schema
+from .tasks import task, enqueue
+
+_refill_lock = Lock()
+
+
+def pool_enabled():
+    return current_app.config["TENANT_POOL_LOW_WATER"] > 0 and \
+        db.engine.dialect.name == "postgresql"
+
+
+def create_spare_schema():
+    """create one fully migrated spare schema and add it to the pool"""
+    schema = f"spare_{uuid4().hex}"
+    Database(schema).create_tenant_schema()
+    get_tenant_registry().evict(schema)
+
+    db.session.add(SpareSchema(schema_name=schema, revision=get_tenant_head()))
+    db.session.commit()
+    return schema
+
+
+def drop_stale_spare_schemas():
+    """drop spare schemas that are not at the tenant migrations head"""
+    stale = db.session.scalars(
+        select(SpareSchema.schema_name)
+        .where(SpareSchema.revision != get_tenant_head())
+    ).all()
+
+    for schema in stale:
+        db.session.execute(delete(SpareSchema).where(SpareSchema.schema_name == schema))
+        db.session.execute(text(f"DROP SCHEMA IF EXISTS {quote_schema(schema)} CASCADE"))
+        db.session.commit()
+    return len(stale)
+
+
+def fill_spare_pool(size=None):
+    """top the pool up to `size` spare schemas (TENANT_POOL_SIZE by default)
+
+    returns:
+        int: number of spare schemas created
+    """
+    size = size or current_app.config["TENANT_POOL_SIZE"]
+    drop_stale_spare_schemas()
+
+    available = db.session.scalar(select(func.count()).select_from(SpareSchema))
+    for _ in range(size - available):
+        create_spare_schema()
+    return max(size - available, 0)
+
+
+def _refill_spare_pool(app):
+    with app.app_context():
+        try:
+            available = db.session.scalar(
+                select(func.count()).select_from(SpareSchema)
+                .where(SpareSchema.revision == get_tenant_head())
+            )
+            if available < app.config["TENANT_POOL_LOW_WATER"]:
+                fill_spare_pool()
+        except Exception:
+            app.logger.exception("Refilling the spare schema pool failed")
+        finally:
+            db.session.remove()
+            _refill_lock.release()
+
+
+def refill_spare_pool_async():
+    """refill the pool in the background once it is below the low-water mark"""
+    if not _refill_lock.acquire(blocking=False):
+        return
+    Thread(target=_refill_spare_pool,
+           args=(current_app._get_current_object(),)).start()
+
+
+def claim_spare_schema(tenant):
+    """rename a spare schema to the schema of a new tenant
+
+    the spare row is removed and the schema renamed in a single
+    transaction, concurrent claims skip rows that are already locked
+
+    returns:
+        bool: False when there is no spare schema at the current head
+    """
+    if not pool_enabled():
+        return False
+
+    candidate = (
+        select(SpareSchema.schema_name)
+        .where(SpareSchema.revision == get_tenant_head())
+        .order_by(SpareSchema.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+
+    with db.engines["public"].begin() as connection:
+        schema = connection.execute(
+            delete(SpareSchema)
+            .where(SpareSchema.schema_name == candidate)
+            .returning(SpareSchema.schema_name)
+        ).scalar()
+
+        if schema is not None:
+            connection.execute(text(
+                f"ALTER SCHEMA {quote_schema(schema)} RENAME TO {quote_schema(tenant)}"
+            ))
+
+    refill_spare_pool_async()
+    return schema is not None
+
+
+def _lease_expired():
+    """jobs whose run stopped renewing its lease, each step of a run
+    renews it through updated_at"""
+    expired = datetime.now(timezone.utc) - \
+        timedelta(seconds=current_app.config["PROVISIONING_LEASE_SECONDS"])
+    return and_(ProvisioningJob.status.in_(['Pending', 'Running']),
+                ProvisioningJob.updated_at < expired)
+
+
+def retryable_provisioning_jobs():
+    """ids of the jobs that failed or were abandoned by their run"""
+    return db.session.scalars(
+        select(ProvisioningJob.job_id)
+        .where(or_(ProvisioningJob.status == 'Failed', _lease_expired()))
+        .order_by(ProvisioningJob.created_at)
+    ).all()
+
+
+def claim_provisioning_job(job_id):
+    """Mark a job Running for this run
+
+    a job that is Running with a live lease belongs to another run and is
+    not claimed, so a tenant is never provisioned twice at the same time
+
+    returns:
+        ProvisioningJob: the claimed job, None if it cannot be claimed
+    """
+    claimed = db.session.execute(
+        update(ProvisioningJob)
+        .where(ProvisioningJob.job_id == job_id,
+               or_(ProvisioningJob.status.in_(['Pending', 'Failed']), _lease_expired()))
+        .values(status='Running', step='schema', error=None,
+                updated_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return db.session.get(ProvisioningJob, job_id, populate_existing=True) if claimed else None
+
+
+def _update_job(job, **fields):
+    for field, value in fields.items():
+        setattr(job, field, value)
+    db.session.commit()
+
+
+@task
+def provision_tenant(job_id):
+    """create the tenant schema and send the validation email of a new organization"""
+    from ..auth.email import send_account_validation_email
+
+    job = claim_provisioning_job(job_id)
+    if job is None:
+        return
+
+    try:
+        if not claim_spare_schema(job.organization_id):
+            Database(job.organization_id).create_tenant_schema()
+
+        _update_job(job, step='email')
+        if current_app.config["SEND_ACCOUNT_VALIDATION_EMAIL"]:
+            send_account_validation_email(user=db.session.get(User, job.user_id))
+
+        _update_job(job, status='Complete', step=None)
+
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception(f"Provisioning job {job_id} failed")
+        # the details stay in the logs, the job is shown to unauthenticated clients
+        _update_job(job, status='Failed', error='Provisioning failed, it will be retried')
+
+
+def start_provisioning(organization, user):
+    """queue the provisioning of a new organization
+
+    returns:
+        ProvisioningJob: job reporting the provisioning progress
+    """
+    job = ProvisioningJob(organization_id=organization.organization_id,
+                          user_id=user.user_id)
+    db.session.add(job)
+    db.session.commit()
+
+    enqueue(provision_tenant, job.job_id)
+    return job
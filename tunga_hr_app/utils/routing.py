@@ -0,0 +1,134 @@
+"""Read replica routing
+
+sends the queries of read-only requests to replica databases
+"""
+from functools import wraps
+from threading import Lock
+from time import monotonic
+
+from flask import current_app, g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError
+
+
+class ReplicaSet:
+    """round robin over replica engines, skipping replicas that failed"""
+
+    def __init__(self, engines, retry_after=30):
+        self.engines = engines
+        self.retry_after = retry_after
+        self._lock = Lock()
+        self._next = 0
+        self._down_until = {}
+
+    def choose(self):
+        """return the next healthy replica engine, None if all are down"""
+        now = monotonic()
+        with self._lock:
+            for _ in range(len(self.engines)):
+                engine = self.engines[self._next]
+                self._next = (self._next + 1) % len(self.engines)
+                if self._down_until.get(engine, 0) <= now:
+                    return engine
+        return None
+
+    def mark_down(self, engine):
+        with self._lock:
+            self._down_until[engine] = monotonic() + self.retry_after
+
+    def is_down(self, engine):
+        with self._lock:
+            return self._down_until.get(engine, 0) > monotonic()
+
+
+class RoutingSession(Session):
+    """session sending SELECTs of read-only requests to a replica
+
+    a replica is picked once per session and the session sticks to the
+    primary after its first write, so a request always reads its own writes
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        is_select = getattr(clause, "is_select", False)
+        if bind is None and clause is not None and not is_select:
+            self.info["wrote"] = True
+
+        if bind is None and is_select and self._read_only():
+            replica = self._replica()
+            if replica is not None:
+                return replica
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _read_only(self):
+        return has_request_context() and g.get("read_only", False) and \
+            not self.info.get("wrote", False)
+
+    def _replica(self):
+        if "replica" not in self.info:
+            replicas = current_app.extensions.get("replicas")
+            self.info["replica"] = replicas.choose() if replicas else None
+        return self.info["replica"]
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _session_wrote(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _retry_failed_replica(orm_execute_state):
+    """run a read again when the replica it was sent to fails
+
+    the failing replica is marked down by its handle_error listener and the
+    read is retried on the next healthy replica, or the primary once none
+    is left, so the request that hit the failure still gets its rows
+    """
+    session = orm_execute_state.session
+    if not orm_execute_state.is_select or not session._read_only():
+        return None
+
+    replicas = current_app.extensions.get("replicas")
+    while True:
+        replica = session._replica()
+        try:
+            return orm_execute_state.invoke_statement()
+        except DBAPIError:
+            if replica is None or not replicas.is_down(replica):
+                raise
+            current_app.logger.warning("Read replica failed, retrying the read")
+            session.info["replica"] = replicas.choose()
+
+
+def read_only(f):
+    """route the queries of a view to the read replicas"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        g.read_only = True
+        return f(*args, **kwargs)
+    return decorated
+
+
+def init_replicas(app):
+    """create the engines of SQLALCHEMY_REPLICA_URIS"""
+    from .database import bind_tenant_engine
+
+    urls = app.config["SQLALCHEMY_REPLICA_URIS"]
+    if not urls:
+        return
+
+    options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    engines = [create_engine(url, **options) for url in urls]
+    replicas = ReplicaSet(engines, app.config["REPLICA_RETRY_AFTER"])
+
+    for engine in engines:
+        if app.config["TENANT_BINDING_MODE"] == "search_path":
+            bind_tenant_engine(engine, app.config["TENANT_RESET_ON_CHECKIN"])
+
+        @event.listens_for(engine, "handle_error")
+        def _replica_failed(context, engine=engine):
+            if context.is_disconnect or context.connection is None:
+                replicas.mark_down(engine)
+
+    app.extensions["replicas"] = replicas
@@ -0,0 +1,96 @@
+"""Password hashing
+
+hashes and verifies passwords on a bounded process pool, so a burst of
+logins cannot pin every request worker on CPU
+"""
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from functools import lru_cache
+from os import getpid
+from threading import BoundedSemaphore, Lock
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_pool = None
+_pool_pid = None
+_slots = None
+_pool_lock = Lock()
+
+
+class HashingPoolBusy(Exception):
+    """raised when the hashing pool has no room for another password"""
+
+
+def _get_pool():
+    global _pool, _pool_pid, _slots
+
+    workers = current_app.config["PASSWORD_HASH_WORKERS"]
+    if not workers:
+        return None, None
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_pid = getpid()
+            _slots = BoundedSemaphore(
+                workers + current_app.config["PASSWORD_HASH_QUEUE"]
+            )
+        return _pool, _slots
+
+
+def _run(fn, *args):
+    pool, slots = _get_pool()
+    if pool is None:
+        return fn(*args)
+
+    if not slots.acquire(blocking=False):
+        raise HashingPoolBusy()
+    try:
+        future = pool.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+
+    # the slot is held until the job ends, not until the caller stops
+    # waiting, so timed out jobs still count against the pool
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=current_app.config["PASSWORD_HASH_TIMEOUT"])
+    except TimeoutError:
+        raise HashingPoolBusy()
+
+
+def hash_password(password):
+    """hash a password with PASSWORD_HASH_METHOD"""
+    return _run(generate_password_hash, password,
+                current_app.config["PASSWORD_HASH_METHOD"])
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    """full parameter form of a hash method, as werkzeug writes it in hashes
+
+    e.g. "scrypt" becomes "scrypt:32768:8:1"
+    """
+    return generate_password_hash("", method).split("$", 1)[0]
+
+
+def needs_rehash(password_hash):
+    """check if a hash was made with other parameters than PASSWORD_HASH_METHOD"""
+    return password_hash.split("$", 1)[0] != \
+        _method_prefix(current_app.config["PASSWORD_HASH_METHOD"])
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None and _pool_pid == getpid():
+        _pool.shutdown(wait=False, cancel_futures=True)
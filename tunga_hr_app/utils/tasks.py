@@ -0,0 +1,87 @@
+"""Background tasks
+
+tasks run on celery when CELERY_BROKER_URL is set, otherwise on a
+bounded in-process thread pool
+"""
+from concurrent.futures import ThreadPoolExecutor
+from os import getpid
+from threading import Lock
+
+from flask import current_app
+
+from tunga_hr_app import db
+
+_tasks = {}
+_executor = None
+_executor_pid = None
+_executor_lock = Lock()
+
+
+def task(fn):
+    """register a function as a background task"""
+    _tasks[fn.__name__] = fn
+    return fn
+
+
+def celery_init_app(app):
+    """create the celery application running the registered tasks"""
+    try:
+        from celery import Celery, Task
+    except ImportError:
+        raise RuntimeError("CELERY_BROKER_URL is set but celery is not installed")
+
+    class FlaskTask(Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+
+    celery_app = Celery(app.name, task_cls=FlaskTask,
+                        broker=app.config["CELERY_BROKER_URL"],
+                        backend=app.config["CELERY_RESULT_BACKEND"])
+    for name, fn in _tasks.items():
+        celery_app.task(name=name)(fn)
+
+    app.extensions["celery"] = celery_app
+    return celery_app
+
+
+def _get_executor():
+    global _executor, _executor_pid
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config["TASK_WORKERS"],
+                thread_name_prefix="task"
+            )
+            _executor_pid = getpid()
+        return _executor
+
+
+def _run_task(app, fn, args):
+    with app.app_context():
+        try:
+            fn(*args)
+        except Exception:
+            app.logger.exception(f"Task {fn.__name__} failed")
+        finally:
+            db.session.remove()
+
+
+def enqueue(fn, *args):
+    """run a registered task in the background
+
+    args:
+        fn: function registered with @task
+        args: JSON serializable arguments of the task
+    """
+    if current_app.config["TASKS_ALWAYS_EAGER"]:
+        return fn(*args)
+
+    celery_app = current_app.extensions.get("celery")
+    if celery_app is not None:
+        return celery_app.send_task(fn.__name__, args=args)
+
+    return _get_executor().submit(
+        _run_task, current_app._get_current_object(), fn, args
+    )